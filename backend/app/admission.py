@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from .config import (
+    GENERATE_MAX_CONCURRENT,
+    GENERATE_MAX_QUEUE,
+    GENERATE_MAX_QUEUE_PER_CLIENT,
+)
+
+# weight of the newest sample in the service time moving average
+SERVICE_TIME_EWMA_ALPHA = 0.2
+# service time assumed before any generation has finished
+DEFAULT_SERVICE_SECONDS = 30.0
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int, queue_position: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+
+class Ticket:
+    """
+    A request's place in the admission queue. Use as an async context
+    manager: entering waits for the turn, leaving frees the slot.
+    """
+
+    def __init__(
+        self, controller: AdmissionController, client_id: str, wait: bool = False
+    ):
+        self._controller = controller
+        self.client_id = client_id
+        self.wait = wait
+        self._future: Optional[asyncio.Future] = None
+        self._admitted_at: Optional[float] = None
+        self._done = False
+
+    async def __aenter__(self) -> Ticket:
+        if self._future is not None:
+            try:
+                await self._future
+            except asyncio.CancelledError:
+                self.release()
+                raise
+        self._admitted_at = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+    def release(self) -> None:
+        """Give up the slot, or the place in the queue if not admitted yet."""
+        if self._done:
+            return
+        self._done = True
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of the LLM: at most max_concurrent requests
+    generate at once, and at most max_queue wait (max_queue_per_client per
+    client). Anything beyond is rejected straight away. Waiting requests
+    are admitted round-robin across clients, so one caller with many
+    requests queued cannot hold up everyone else.
+
+    Background callers (jobs, pre-generation) enqueue with wait=True: they
+    share the same slots and round-robin order but are never rejected, as
+    they have no client to send a 429 to.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = GENERATE_MAX_CONCURRENT,
+        max_queue: int = GENERATE_MAX_QUEUE,
+        max_queue_per_client: int = GENERATE_MAX_QUEUE_PER_CLIENT,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_client = max(0, max_queue_per_client)
+        self.active = 0
+        self.rejected = 0
+        self.service_seconds = DEFAULT_SERVICE_SECONDS
+        # client -> its waiting tickets; iteration order is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def enqueue(self, client_id: str, wait: bool = False) -> Ticket:
+        """
+        Take a ticket for client_id, or raise AdmissionRejected if the queue
+        (or the client's share of it) is full. With wait, the queue limits
+        do not apply and the ticket simply waits for its turn.
+        """
+        ticket = Ticket(self, client_id, wait)
+        if self.active < self.max_concurrent and not self._waiting:
+            self.active += 1
+            return ticket
+
+        own = len(self._waiting.get(client_id, ()))
+        if not wait:
+            position = self._position(client_id, own)
+            # waiting background tickets do not use up the API's queue room
+            limited = sum(not t.wait for q in self._waiting.values() for t in q)
+            if limited >= self.max_queue:
+                self._reject("Generation queue is full", position)
+            if own >= self.max_queue_per_client:
+                self._reject("Too many queued generations for this client", position)
+
+        ticket._future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client_id, deque()).append(ticket)
+        return ticket
+
+    def _position(self, client_id: str, own: int) -> int:
+        """
+        1-based queue position of a new request from a client with own
+        requests waiting: with round-robin, every other client gets at most
+        own + 1 turns before it.
+        """
+        others = sum(
+            min(len(q), own + 1) for c, q in self._waiting.items() if c != client_id
+        )
+        return own + 1 + others
+
+    def _reject(self, reason: str, position: int) -> None:
+        self.rejected += 1
+        raise AdmissionRejected(reason, self.retry_after(position), position)
+
+    def retry_after(self, position: int) -> int:
+        """Seconds until a request at position would likely be admitted."""
+        rounds = math.ceil(position / self.max_concurrent)
+        return max(1, int(rounds * self.service_seconds))
+
+    def _release(self, ticket: Ticket) -> None:
+        queue = self._waiting.get(ticket.client_id)
+        if queue is not None and ticket in queue:
+            # left while still queued
+            queue.remove(ticket)
+            if not queue:
+                del self._waiting[ticket.client_id]
+            if not ticket._future.done():
+                ticket._future.cancel()
+            return
+
+        if ticket._admitted_at is not None:
+            elapsed = time.monotonic() - ticket._admitted_at
+            self.service_seconds += SERVICE_TIME_EWMA_ALPHA * (
+                elapsed - self.service_seconds
+            )
+        self.active -= 1
+        self._admit_next()
+
+    def _admit_next(self) -> None:
+        while self._waiting and self.active < self.max_concurrent:
+            client_id, queue = next(iter(self._waiting.items()))
+            ticket = queue.popleft()
+            # the client goes to the back of the round-robin order
+            del self._waiting[client_id]
+            if queue:
+                self._waiting[client_id] = queue
+            self.active += 1
+            ticket._future.set_result(None)
+
+    def summary(self) -> dict:
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "queued_by_client": {c: len(q) for c, q in self._waiting.items()},
+            "rejected": self.rejected,
+            "service_seconds": round(self.service_seconds, 1),
+        }
+
+
+admission = AdmissionController()
@@ -1,21 +1,34 @@
+import asyncio
+import json
+import tempfile
 from datetime import datetime
-from typing import List, Optional
+from typing import IO, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import column, delete, func, insert
 from sqlmodel import Session, select
 
+from ... import review_summary
 from ...db import get_session
+from ...review_queue import review_queue
 from ...models import Card, Deck, ReviewLog, SchedulingState
 from ...schemas import (
+    BatchDeleteCardsRequest,
+    BulkCardCreateItem,
     BulkCreateCardsRequest,
     CardCreate,
     CardRead,
     CardUpdate,
 )
-from ...srs import initialize_scheduling_state
+from ...srs import initial_scheduling_values, initialize_scheduling_state
 
 router = APIRouter(prefix="/api", tags=["cards"])
 
+# cards per INSERT batch of a streamed import
+IMPORT_BATCH_SIZE = 1000
+# import bodies are spooled in memory up to this size, then to a temp file
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
 
 def _tags_list_to_str(tags: List[str]) -> str:
     cleaned = [t.strip() for t in tags if t.strip()]
@@ -87,7 +100,10 @@ def create_card(
 
     sched = initialize_scheduling_state(card)
     session.add(sched)
+    due = sched.due
     session.commit()
+    review_summary.invalidate()
+    review_queue.update(card.id, due)
 
     return CardRead(
         id=card.id,
@@ -103,56 +119,125 @@ def create_card(
     )
 
 
+def _insert_cards(
+    session: Session, deck_id: int, items: List[BulkCardCreateItem]
+) -> List[CardRead]:
+    """
+    Insert cards and their scheduling states with multi-row INSERTs
+    (ids come back via RETURNING), without committing.
+    """
+    if not items:
+        return []
+    now = datetime.utcnow()
+    rows = [
+        {
+            "deck_id": deck_id,
+            "front": item.front,
+            "back": item.back,
+            "card_type": item.card_type,
+            "tags": _tags_list_to_str(item.tags),
+            "source_id": item.source_id,
+            "source_chunk_id": item.source_chunk_id,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for item in items
+    ]
+    ids = session.execute(
+        insert(Card).returning(Card.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    initial = initial_scheduling_values()
+    session.execute(
+        insert(SchedulingState), [{"card_id": card_id, **initial} for card_id in ids]
+    )
+    return [
+        CardRead(id=card_id, **{**row, "tags": _tags_str_to_list(row["tags"])})
+        for card_id, row in zip(ids, rows)
+    ]
+
+
+def _get_deck(session: Session, deck_id: int) -> Deck:
+    deck = session.get(Deck, deck_id)
+    if deck is None:
+        raise HTTPException(status_code=400, detail="Deck not found")
+    return deck
+
+
 @router.post("/cards/bulk_create", response_model=List[CardRead])
 def bulk_create_cards(
     req: BulkCreateCardsRequest,
     session: Session = Depends(get_session),
 ) -> List[CardRead]:
-    deck = session.get(Deck, req.deck_id)
-    if deck is None:
-        raise HTTPException(status_code=400, detail="Deck not found")
+    _get_deck(session, req.deck_id)
+    result = _insert_cards(session, req.deck_id, req.cards)
+    session.commit()
+    review_summary.invalidate()
+    review_queue.add((c.id for c in result), initial_scheduling_values()["due"])
+    return result
 
-    created_cards: List[Card] = []
-
-    for item in req.cards:
-        card = Card(
-            deck_id=req.deck_id,
-            front=item.front,
-            back=item.back,
-            card_type=item.card_type,
-            tags=_tags_list_to_str(item.tags),
-            source_id=item.source_id,
-            source_chunk_id=item.source_chunk_id,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-        )
-        session.add(card)
-        session.commit()
-        session.refresh(card)
 
-        sched = initialize_scheduling_state(card)
-        session.add(sched)
-        session.commit()
+def _parse_import_line(line: bytes, line_no: int) -> BulkCardCreateItem:
+    try:
+        return BulkCardCreateItem(**json.loads(line))
+    except (ValueError, TypeError) as e:
+        # ValidationError is a ValueError
+        raise HTTPException(status_code=400, detail=f"Line {line_no}: {e}")
+
+
+def _import_spooled(session: Session, deck_id: int, spool: IO[bytes]) -> int:
+    """Insert the validated lines of spool in batches and commit once."""
+    spool.seek(0)
+    created = 0
+    batch: List[BulkCardCreateItem] = []
+    for line_no, line in enumerate(spool, start=1):
+        batch.append(_parse_import_line(line, line_no))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            _insert_cards(session, deck_id, batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        _insert_cards(session, deck_id, batch)
+        created += len(batch)
+    session.commit()
+    return created
 
-        created_cards.append(card)
 
-    result: List[CardRead] = []
-    for c in created_cards:
-        result.append(
-            CardRead(
-                id=c.id,
-                deck_id=c.deck_id,
-                front=c.front,
-                back=c.back,
-                card_type=c.card_type,
-                tags=_tags_str_to_list(c.tags),
-                source_id=c.source_id,
-                source_chunk_id=c.source_chunk_id,
-                created_at=c.created_at,
-                updated_at=c.updated_at,
-            )
-        )
-    return result
+@router.post("/cards/import")
+async def import_cards(
+    deck_id: int,
+    request: Request,
+    session: Session = Depends(get_session),
+) -> dict:
+    """
+    Create cards from an NDJSON body, one BulkCardCreateItem per line. The
+    body is validated as it arrives and spooled (to a temp file once larger
+    than IMPORT_SPOOL_BYTES), so memory use does not grow with the import
+    size. Only then are the cards inserted in batches and committed in one
+    transaction, so the database write lock is never held while waiting on
+    a slow upload, and nothing is written if any line is invalid.
+    """
+    await asyncio.to_thread(_get_deck, session, deck_id)
+
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as spool:
+        buffer = b""
+        line_no = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    _parse_import_line(line, line_no)
+                    spool.write(line.strip() + b"\n")
+        if buffer.strip():
+            _parse_import_line(buffer, line_no + 1)
+            spool.write(buffer.strip() + b"\n")
+
+        created = await asyncio.to_thread(_import_spooled, session, deck_id, spool)
+    review_summary.invalidate()
+    # too many ids to track here; reload the queue instead
+    review_queue.invalidate()
+    return {"created": created}
 
 
 @router.put("/cards/{card_id}", response_model=CardRead)
@@ -182,6 +267,8 @@ def update_card(
     card.updated_at = datetime.utcnow()
     session.add(card)
     session.commit()
+    if card_upd.deck_id is not None:
+        review_summary.invalidate()
     session.refresh(card)
 
     return CardRead(
@@ -198,27 +285,48 @@ def update_card(
     )
 
 
+def delete_cards_where(session: Session, condition) -> List[int]:
+    """
+    Delete the cards matching condition, with their scheduling states and
+    review logs, in three set-based statements however many cards match.
+    Does not commit; returns the ids of the deleted cards.
+    """
+    card_ids = select(Card.id).where(condition)
+    for stmt in (
+        delete(SchedulingState).where(SchedulingState.card_id.in_(card_ids)),
+        delete(ReviewLog).where(ReviewLog.card_id.in_(card_ids)),
+        delete(Card).where(condition).returning(Card.id),
+    ):
+        result = session.exec(stmt.execution_options(synchronize_session=False))
+    return list(result.scalars().all())
+
+
 @router.delete("/cards/{card_id}")
 def delete_card(
     card_id: int,
     session: Session = Depends(get_session),
 ) -> dict:
-    card = session.get(Card, card_id)
-    if card is None:
+    deleted = delete_cards_where(session, Card.id == card_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Card not found")
+    session.commit()
+    review_summary.invalidate()
+    review_queue.remove(deleted)
+    return {"status": "deleted"}
 
-    # delete scheduling state
-    stmt = select(SchedulingState).where(SchedulingState.card_id == card.id)
-    sched = session.exec(stmt).first()
-    if sched is not None:
-        session.delete(sched)
-
-    # delete review logs
-    rev_stmt = select(ReviewLog).where(ReviewLog.card_id == card.id)
-    revs = session.exec(rev_stmt).all()
-    for r in revs:
-        session.delete(r)
 
-    session.delete(card)
+@router.post("/cards/batch_delete")
+def batch_delete_cards(
+    req: BatchDeleteCardsRequest,
+    session: Session = Depends(get_session),
+) -> dict:
+    """Delete many cards in one short transaction; unknown ids are ignored."""
+    # pass the ids as one JSON parameter, clear of SQLite's variable limit
+    ids = select(column("value")).select_from(
+        func.json_each(json.dumps(req.card_ids))
+    )
+    deleted = delete_cards_where(session, Card.id.in_(ids))
     session.commit()
-    return {"status": "deleted"}
+    review_summary.invalidate()
+    review_queue.remove(deleted)
+    return {"deleted": len(deleted)}
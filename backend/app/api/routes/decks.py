@@ -3,9 +3,12 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
+from ... import review_summary
 from ...db import get_session
-from ...models import Deck, Card, ReviewLog, SchedulingState
+from ...review_queue import review_queue
+from ...models import Deck, Card
 from ...schemas import DeckCreate, DeckRead
+from .cards import delete_cards_where
 
 router = APIRouter(prefix="/api", tags=["decks"])
 
@@ -48,22 +51,9 @@ def delete_deck(
     if deck is None:
         raise HTTPException(status_code=404, detail="Deck not found")
 
-    cards = session.exec(select(Card).where(Card.deck_id == deck_id)).all()
-    for card in cards:
-        sched_stmt = select(SchedulingState).where(
-            SchedulingState.card_id == card.id
-        )
-        sched = session.exec(sched_stmt).first()
-        if sched is not None:
-            session.delete(sched)
-
-        rev_stmt = select(ReviewLog).where(ReviewLog.card_id == card.id)
-        revs = session.exec(rev_stmt).all()
-        for r in revs:
-            session.delete(r)
-
-        session.delete(card)
-
+    deleted = delete_cards_where(session, Card.deck_id == deck_id)
     session.delete(deck)
     session.commit()
+    review_summary.invalidate()
+    review_queue.remove(deleted)
     return {"status": "deleted"}
\ No newline at end of file
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from ... import review_summary
+from ...db import get_session
+from ...models import Card, Deck, DraftCard
+from ...pregen import pregenerator
+from ...review_queue import review_queue
+from ...schemas import AcceptDraftsRequest, DraftCardRead, DraftSelection
+from ...srs import initialize_scheduling_state
+
+router = APIRouter(prefix="/api", tags=["drafts"])
+
+
+def _selection_filter(sel: DraftSelection):
+    if sel.draft_ids:
+        return DraftCard.id.in_(sel.draft_ids)
+    if sel.source_id is not None:
+        return DraftCard.source_id == sel.source_id
+    raise HTTPException(status_code=400, detail="Give draft_ids or source_id")
+
+
+@router.get("/drafts", response_model=List[DraftCardRead])
+def list_drafts(
+    source_id: Optional[int] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    session: Session = Depends(get_session),
+) -> List[DraftCard]:
+    statement = select(DraftCard)
+    if source_id is not None:
+        statement = statement.where(DraftCard.source_id == source_id)
+    statement = statement.order_by(DraftCard.source_id, DraftCard.id).limit(limit)
+    return session.exec(statement).all()
+
+
+@router.get("/drafts/status")
+def pregen_status() -> dict:
+    return pregenerator.status()
+
+
+@router.post("/drafts/accept")
+def accept_drafts(
+    req: AcceptDraftsRequest,
+    session: Session = Depends(get_session),
+) -> dict:
+    """Turn the selected drafts into cards in deck_id, in one transaction."""
+    deck = session.get(Deck, req.deck_id)
+    if deck is None:
+        raise HTTPException(status_code=400, detail="Deck not found")
+
+    drafts = session.exec(select(DraftCard).where(_selection_filter(req))).all()
+    now = datetime.utcnow()
+    cards = [
+        Card(
+            deck_id=req.deck_id,
+            front=d.front,
+            back=d.back,
+            source_id=d.source_id,
+            source_chunk_id=d.source_chunk_id,
+            created_at=now,
+            updated_at=now,
+        )
+        for d in drafts
+    ]
+    session.add_all(cards)
+    session.flush()
+    states = [initialize_scheduling_state(card) for card in cards]
+    session.add_all(states)
+    session.exec(delete(DraftCard).where(DraftCard.id.in_([d.id for d in drafts])))
+    queued = [(state.card_id, state.due) for state in states]
+    session.commit()
+    review_summary.invalidate()
+    for card_id, due in queued:
+        review_queue.update(card_id, due)
+    return {"created": len(cards)}
+
+
+@router.post("/drafts/reject")
+def reject_drafts(
+    sel: DraftSelection,
+    session: Session = Depends(get_session),
+) -> dict:
+    result = session.exec(delete(DraftCard).where(_selection_filter(sel)))
+    session.commit()
+    return {"removed": result.rowcount}
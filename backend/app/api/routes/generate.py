@@ -1,11 +1,18 @@
-from typing import List
+import json
+from typing import AsyncIterator, List
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlmodel import Session
 
+from ... import llm_cache, llm_slots
+from ...admission import AdmissionRejected, Ticket, admission
+from ...content_manager import load_chunk_texts
 from ...db import get_session
-from ...llm_client import call_llm_for_cards
-from ...models import Source, SourceChunk
+from ...generation_planner import generate_cards_planned, stream_cards_planned
+from ...llm_client import generation_summary, interactive_use
+from ...llm_router import router as llm_router
 from ...schemas import (
     GenerateCardsRequest,
     GenerateCardsResponse,
@@ -15,42 +22,62 @@ from ...schemas import (
 router = APIRouter(prefix="/api", tags=["generate"])
 
 
-@router.post("/generate_cards", response_model=GenerateCardsResponse)
+def _collect_source_texts(req: GenerateCardsRequest, session: Session) -> List[str]:
+    try:
+        return load_chunk_texts(session, req.source_id, req.chunk_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _client_id(request: Request) -> str:
+    """Who a request counts against for admission fairness."""
+    client_id = request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
+
+
+def _admit(request: Request) -> Ticket:
+    """Queue the request for the LLM, or answer 429 when the queue is full."""
+    try:
+        return admission.enqueue(_client_id(request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": e.reason,
+                "queue_position": e.queue_position,
+                "retry_after": e.retry_after,
+            },
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@router.post(
+    "/generate_cards",
+    response_model=GenerateCardsResponse,
+    responses={429: {"description": "Too many generations queued"}},
+)
 async def generate_cards(
     req: GenerateCardsRequest,
+    request: Request,
     session: Session = Depends(get_session),
 ) -> GenerateCardsResponse:
-    combined_text = "\n"
-    source = session.get(Source, req.source_id)
-    if source is not None:
-        if req.chunk_ids:
-            stmt = (
-                select(SourceChunk)
-                .where(
-                    SourceChunk.source_id == source.id,
-                    SourceChunk.id.in_(req.chunk_ids),
-                )
-                .order_by(SourceChunk.id)
-            )
-        else:
-            stmt = (
-                select(SourceChunk)
-                .where(SourceChunk.source_id == source.id)
-                .order_by(SourceChunk.id)
-            )
-
-        chunks: List[SourceChunk] = session.exec(stmt).all()
-        if not chunks:
-            raise HTTPException(
-                status_code=400, detail="No chunks found for requested source"
-            )
-
-        combined_text += "\n\n".join(ch.text for ch in chunks)
-        
+    texts = _collect_source_texts(req, session)
+    ticket = _admit(request)
+
     try:
-        card_dicts = await call_llm_for_cards(
-            combined_text, req.instructions, req.num_cards, req.temperature
-        )
+        # interactive_use goes first so a request still waiting for a slot
+        # already interrupts pre-generation, which may be holding one
+        with interactive_use():
+            async with ticket:
+                card_dicts = await generate_cards_planned(
+                    texts,
+                    req.instructions,
+                    req.num_cards,
+                    req.temperature,
+                    use_cache=req.use_cache,
+                )
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -58,3 +85,86 @@ async def generate_cards(
         GeneratedCard(front=c["front"], back=c["back"]) for c in card_dicts
     ]
     return GenerateCardsResponse(cards=generated_cards)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post(
+    "/generate_cards/stream",
+    responses={429: {"description": "Too many generations queued"}},
+)
+async def generate_cards_stream(
+    req: GenerateCardsRequest,
+    request: Request,
+    session: Session = Depends(get_session),
+) -> StreamingResponse:
+    """
+    Like /generate_cards, but returns a text/event-stream with one "card"
+    event per card as soon as the model has written it, then a "done" event
+    with the total (or an "error" event).
+    """
+    texts = _collect_source_texts(req, session)
+    ticket = _admit(request)
+
+    async def events() -> AsyncIterator[str]:
+        count = 0
+        try:
+            with interactive_use():
+                async with ticket:
+                    async for card in stream_cards_planned(
+                        texts,
+                        req.instructions,
+                        req.num_cards,
+                        req.temperature,
+                        use_cache=req.use_cache,
+                    ):
+                        count += 1
+                        yield _sse("card", GeneratedCard(**card).dict())
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+        yield _sse("done", {"count": count})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # frees the queue place even if the stream is never iterated
+        background=BackgroundTask(ticket.release),
+    )
+
+
+@router.get("/generate/admission")
+def admission_stats() -> dict:
+    return admission.summary()
+
+
+@router.get("/generate/cache")
+def generation_cache_stats() -> dict:
+    return llm_cache.summary()
+
+
+@router.delete("/generate/cache")
+def clear_generation_cache() -> dict:
+    return {"removed": llm_cache.clear()}
+
+
+@router.get("/generate/prompt_cache")
+def prompt_cache_stats() -> dict:
+    """
+    llama.cpp prompt-eval time per request, split into cold requests (slot
+    held another source) and warm ones (slot already held, or was restored
+    to, the same source text).
+    """
+    return llm_slots.summary([b.slots for b in llm_router.backends])
+
+
+@router.get("/generate/efficiency")
+def generation_efficiency() -> dict:
+    """
+    Generation requests since startup, and the GPU time / completion tokens
+    that went into output no card was recovered from, per returned card.
+    """
+    return generation_summary()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from ...config import NOTES_ROOT
+from ...llm_router import router as llm_router
 
 router = APIRouter(prefix="/api", tags=["health"])
 
@@ -8,3 +9,9 @@ router = APIRouter(prefix="/api", tags=["health"])
 @router.get("/health")
 def health() -> dict:
     return {"status": "ok", "notes_root": str(NOTES_ROOT)}
+
+
+@router.get("/health/llm")
+def llm_backends() -> list:
+    """Per-backend health, load (in flight, queue depth) and latency."""
+    return llm_router.summary()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from ...content_manager import load_chunk_texts
+from ...db import get_session
+from ...jobs import FINISHED, job_snapshot, manager
+from ...models import GenerationJob
+from ...schemas import GenerateJobRequest, JobRead
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+
+# keep-alive comment interval for idle event streams
+EVENTS_PING_SECONDS = 15
+
+
+@router.post("/jobs/generate", response_model=JobRead, status_code=202)
+async def submit_generate_job(
+    req: GenerateJobRequest,
+    session: Session = Depends(get_session),
+) -> JobRead:
+    """
+    Queue a card generation and return immediately. Poll GET /jobs/{id} or
+    subscribe to /jobs/{id}/events for progress and the generated cards.
+    """
+    try:
+        await asyncio.to_thread(
+            load_chunk_texts, session, req.source_id, req.chunk_ids
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = await manager.submit(
+        req.dict(exclude={"priority"}), priority=req.priority
+    )
+    return JobRead(**job_snapshot(job))
+
+
+@router.get("/jobs", response_model=List[JobRead])
+def list_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_session),
+) -> List[JobRead]:
+    statement = select(GenerationJob)
+    if status is not None:
+        statement = statement.where(GenerationJob.status == status)
+    statement = statement.order_by(GenerationJob.created_at.desc()).limit(limit)
+    return [JobRead(**job_snapshot(job)) for job in session.exec(statement).all()]
+
+
+@router.get("/jobs/{job_id}", response_model=JobRead)
+def get_job(job_id: str) -> JobRead:
+    job = manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobRead(**job_snapshot(job))
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobRead)
+async def cancel_job(job_id: str) -> JobRead:
+    job = await manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobRead(**job_snapshot(job))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """
+    text/event-stream of "job" events carrying the job (as GET /jobs/{id})
+    each time its status or progress changes. Ends once the job is finished.
+    """
+    queue = manager.subscribe(job_id)
+    job = await asyncio.to_thread(manager.get, job_id)
+    if not job:
+        manager.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            snapshot = job_snapshot(job)
+            yield _sse("job", snapshot)
+            while snapshot["status"] not in FINISHED:
+                try:
+                    snapshot = await asyncio.wait_for(
+                        queue.get(), timeout=EVENTS_PING_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse("job", snapshot)
+        finally:
+            manager.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
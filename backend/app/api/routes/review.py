@@ -1,9 +1,11 @@
-from datetime import date, datetime
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select
 
+from ... import review_summary
 from ...db import get_session
+from ...review_queue import review_queue
 from ...models import Card, ReviewLog, SchedulingState
 from ...schemas import ReviewAnswerRequest, ReviewCard, ReviewSummary
 from ...srs import initialize_scheduling_state, update_schedule_for_review
@@ -12,32 +14,35 @@ router = APIRouter(prefix="/api/review", tags=["review"])
 
 
 @router.get("/summary", response_model=ReviewSummary)
-def review_summary(
+def get_review_summary(
+    days: int = Query(7, ge=1, le=365),
     session: Session = Depends(get_session),
 ) -> ReviewSummary:
-    today = date.today()
-    stmt = select(SchedulingState).where(SchedulingState.due <= today)
-    due_states = session.exec(stmt).all()
-    return ReviewSummary(due_count=len(due_states))
+    summary = review_summary.get_summary(session, days)
+    return ReviewSummary(due_count=summary["due"], **summary)
+
+
+@router.get("/queue")
+def review_queue_stats() -> dict:
+    return review_queue.summary()
 
 
 @router.get("/next", response_model=ReviewCard)
 def get_next_review_card(
     session: Session = Depends(get_session),
 ) -> ReviewCard:
-    today = date.today()
-    stmt = (
-        select(SchedulingState, Card)
-        .join(Card, Card.id == SchedulingState.card_id)
-        .where(SchedulingState.due <= today)
-        .order_by(SchedulingState.due, Card.id)
-    )
-
-    row = session.exec(stmt).first()
-    if row is None:
-        raise HTTPException(status_code=404, detail="No due cards")
-
-    state, card = row
+    while True:
+        card_id = review_queue.next_card_id(session)
+        if card_id is None:
+            raise HTTPException(status_code=404, detail="No due cards")
+        card = session.get(Card, card_id)
+        state = session.exec(
+            select(SchedulingState).where(SchedulingState.card_id == card_id)
+        ).first()
+        if card is not None and state is not None:
+            break
+        # deleted behind the queue's back
+        review_queue.remove([card_id])
 
     return ReviewCard(
         card_id=card.id,
@@ -86,6 +91,8 @@ def answer_review(
 
     session.add(state)
     session.commit()
+    review_summary.invalidate()
+    review_queue.update(card.id, state.due)
 
     return {
         "status": "ok",
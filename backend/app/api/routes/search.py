@@ -1,37 +1,162 @@
-from typing import List
+import asyncio
+from enum import Enum
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select
 
+from ... import embedding_index, search_index
 from ...db import get_session
-from ...models import SourceChunk
-from ...schemas import SourceChunkRead
+from ...models import Source, SourceChunk
+from ...schemas import ChunkSearchResult
 
 router = APIRouter(prefix="/api", tags=["search"])
 
+# reciprocal rank fusion constant for hybrid search
+RRF_K = 60
+# vector hits are fetched before source filters are applied, so over-fetch
+VECTOR_OVERFETCH = 4
 
-@router.get("/search/chunks", response_model=List[SourceChunkRead])
-def search_chunks(
-    q: str = Query(..., min_length=1),
-    limit: int = Query(20, ge=1, le=100),
-    session: Session = Depends(get_session),
-) -> List[SourceChunkRead]:
+
+class SearchMode(str, Enum):
+    FTS = "fts"
+    VECTOR = "vector"
+    HYBRID = "hybrid"
+
+
+def _keyword_search(
+    session: Session,
+    q: str,
+    limit: int,
+    source_id: Optional[int],
+    source_type: Optional[str],
+) -> List[ChunkSearchResult]:
+    if search_index.fts_available:
+        rows = search_index.search_chunks_fts(
+            session, q, limit, source_id=source_id, source_type=source_type
+        )
+        return [ChunkSearchResult(**row) for row in rows]
+
+    # no FTS5 in this SQLite build: unranked substring scan
     try:
         statement = (
             select(SourceChunk)
+            .join(Source, Source.id == SourceChunk.source_id)
             .where(SourceChunk.text.contains(q))
-            .limit(limit)
         )
+        if source_id is not None:
+            statement = statement.where(SourceChunk.source_id == source_id)
+        if source_type is not None:
+            statement = statement.where(Source.type == source_type)
+        statement = statement.limit(limit)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
     chunks = session.exec(statement).all()
     return [
-        SourceChunkRead(
+        ChunkSearchResult(
             id=ch.id,
+            source_id=ch.source_id,
             kind=ch.kind,
             loc=ch.loc,
             text=ch.text,
         )
         for ch in chunks
     ]
+
+
+async def _vector_search(
+    session: Session,
+    q: str,
+    limit: int,
+    source_id: Optional[int],
+    source_type: Optional[str],
+) -> List[ChunkSearchResult]:
+    filtered = source_id is not None or source_type is not None
+    k = limit * VECTOR_OVERFETCH if filtered else limit
+    try:
+        hits = await embedding_index.index.search(q, k)
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if not hits:
+        return []
+
+    statement = (
+        select(SourceChunk)
+        .join(Source, Source.id == SourceChunk.source_id)
+        .where(SourceChunk.id.in_([chunk_id for chunk_id, _ in hits]))
+    )
+    if source_id is not None:
+        statement = statement.where(SourceChunk.source_id == source_id)
+    if source_type is not None:
+        statement = statement.where(Source.type == source_type)
+    chunks = {
+        ch.id: ch
+        for ch in await asyncio.to_thread(lambda: session.exec(statement).all())
+    }
+
+    results: List[ChunkSearchResult] = []
+    for chunk_id, score in hits:
+        ch = chunks.get(chunk_id)
+        if ch is None:
+            continue
+        results.append(
+            ChunkSearchResult(
+                id=ch.id,
+                source_id=ch.source_id,
+                kind=ch.kind,
+                loc=ch.loc,
+                text=ch.text,
+                score=score,
+            )
+        )
+    return results[:limit]
+
+
+@router.get("/search/chunks", response_model=List[ChunkSearchResult])
+async def search_chunks(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    source_id: Optional[int] = None,
+    source_type: Optional[str] = None,
+    mode: SearchMode = Query(SearchMode.FTS),
+    session: Session = Depends(get_session),
+) -> List[ChunkSearchResult]:
+    """
+    Search chunks, best matches first.
+
+    - fts: full-text search with "phrase" and prefix* queries; score is bm25
+      (lower is better)
+    - vector: semantic search over the embedding index; score is cosine
+      similarity (higher is better)
+    - hybrid: both, merged by reciprocal rank fusion; score is the fused
+      score (higher is better)
+
+    Queries run in worker threads so a slow search does not hold up the
+    event loop.
+    """
+    if mode == SearchMode.FTS:
+        return await asyncio.to_thread(
+            _keyword_search, session, q, limit, source_id, source_type
+        )
+
+    vector_results = await _vector_search(
+        session, q, limit * 2 if mode == SearchMode.HYBRID else limit, source_id, source_type
+    )
+    if mode == SearchMode.VECTOR:
+        return vector_results
+
+    keyword_results = await asyncio.to_thread(
+        _keyword_search, session, q, limit * 2, source_id, source_type
+    )
+
+    fused: Dict[int, float] = {}
+    by_id: Dict[int, ChunkSearchResult] = {}
+    for ranked in (keyword_results, vector_results):
+        for rank, result in enumerate(ranked):
+            fused[result.id] = fused.get(result.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            # prefer the keyword result, which carries a snippet
+            by_id.setdefault(result.id, result)
+
+    best = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [by_id[chunk_id].copy(update={"score": fused[chunk_id]}) for chunk_id in best]
@@ -3,23 +3,25 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
-from ...config import NOTES_ROOT
-from ...content_manager import scan_notes_root
 from ...db import get_session
 from ...models import Source, SourceChunk
+from ...notes_scanner import scanner
 from ...schemas import SourceChunkRead, SourceRead
 
 router = APIRouter(prefix="/api", tags=["sources"])
 
 
 @router.post("/reindex")
-def reindex_notes(
-    session: Session = Depends(get_session),
-) -> dict:
-    processed = scan_notes_root(session, NOTES_ROOT)
+async def reindex_notes() -> dict:
+    processed = await scanner.scan()
     return {"processed_sources": processed}
 
 
+@router.get("/scan/status")
+def scan_status() -> dict:
+    return scanner.status()
+
+
 @router.get("/sources", response_model=List[SourceRead])
 def list_sources(
     session: Session = Depends(get_session),
@@ -67,7 +69,7 @@ def list_source_chunks(
     statement = (
         select(SourceChunk)
         .where(SourceChunk.source_id == source_id)
-        .order_by(SourceChunk.id)
+        .order_by(SourceChunk.position, SourceChunk.id)
     )
     chunks = session.exec(statement).all()
     return [
@@ -8,6 +8,140 @@ NOTES_ROOT = Path(
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./study_tool.db")
 
+# SQLite tuning applied to every connection. WAL lets reads run during the
+# scanner's write transactions; with it, synchronous=NORMAL only fsyncs at
+# checkpoints and stays safe against app crashes (a power cut may lose the
+# last commits). Cache and mmap sizes are in MiB.
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "1") == "1"
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_MB = int(os.environ.get("SQLITE_CACHE_SIZE_MB", "64"))
+SQLITE_MMAP_SIZE_MB = int(os.environ.get("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# connection pool: kept-open connections, extra ones allowed under load
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "8"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "30"))
+
 LLM_API_BASE = os.environ.get("LLM_API_BASE", "http://127.0.0.1:8080/v1")
 LLM_API_KEY = os.environ.get("LLM_API_KEY", "sk-local-test")
 LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "qwen")
+
+# shared HTTP client for all LLM server calls
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "16"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "8")
+)
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.environ.get("LLM_KEEPALIVE_EXPIRY_SECONDS", "120")
+)
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "1") == "1"
+
+# LLM backends generations are routed over, least loaded first, as comma
+# separated "<api base> [concurrency=N] [weight=W]" entries. concurrency is
+# the number of requests sent to it at once (match the server's --parallel),
+# weight scales its share of the load. Defaults to LLM_API_BASE alone.
+LLM_BACKENDS = os.environ.get("LLM_BACKENDS", "")
+LLM_HEALTH_INTERVAL_SECONDS = float(
+    os.environ.get("LLM_HEALTH_INTERVAL_SECONDS", "15")
+)
+# start a second copy of a slow interactive generation on another idle
+# backend after this many seconds; 0 turns hedging off
+LLM_HEDGE_AFTER_SECONDS = float(os.environ.get("LLM_HEDGE_AFTER_SECONDS", "0"))
+
+# admission control for card generation: generations running at once, and
+# how many /api/generate_cards(/stream) requests may wait (in total and per
+# client) before new ones are turned away with 429. Jobs and pre-generation
+# share the slots but wait instead of being turned away
+GENERATE_MAX_CONCURRENT = int(os.environ.get("GENERATE_MAX_CONCURRENT", "2"))
+GENERATE_MAX_QUEUE = int(os.environ.get("GENERATE_MAX_QUEUE", "8"))
+GENERATE_MAX_QUEUE_PER_CLIENT = int(
+    os.environ.get("GENERATE_MAX_QUEUE_PER_CLIENT", "4")
+)
+
+# card output: constrain it to the cards JSON schema (response_format) where
+# the server supports it, and retry up to LLM_CARD_RETRIES times for cards
+# missing from a cut-off or malformed response
+LLM_JSON_SCHEMA = os.environ.get("LLM_JSON_SCHEMA", "1") == "1"
+LLM_CARD_RETRIES = int(os.environ.get("LLM_CARD_RETRIES", "1"))
+
+# llama.cpp prompt (KV) cache reuse: requests are pinned to one of a
+# backend's slots (LLM_SLOTS, or its concurrency= in LLM_BACKENDS) with
+# cache_prompt set, and go back to the slot that last saw the same source
+# text. LLM_SLOT_SAVE also saves/restores a slot's KV state per source,
+# which needs the server to run with --slot-save-path.
+LLM_PROMPT_CACHE = os.environ.get("LLM_PROMPT_CACHE", "1") == "1"
+LLM_SLOTS = int(os.environ.get("LLM_SLOTS", "1"))
+LLM_SLOT_SAVE = os.environ.get("LLM_SLOT_SAVE", "0") == "1"
+LLM_SLOT_SAVE_MAX_FILES = int(os.environ.get("LLM_SLOT_SAVE_MAX_FILES", "64"))
+
+# notes watching: "auto" uses watchdog (inotify/FSEvents/...) when installed
+# and falls back to stat polling; "watchdog", "poll" or "off" force a mode
+NOTES_WATCH_MODE = os.environ.get("NOTES_WATCH_MODE", "auto")
+NOTES_WATCH_DEBOUNCE_SECONDS = float(
+    os.environ.get("NOTES_WATCH_DEBOUNCE_SECONDS", "1.5")
+)
+NOTES_POLL_INTERVAL_SECONDS = float(
+    os.environ.get("NOTES_POLL_INTERVAL_SECONDS", "10")
+)
+# full rescans only act as a consistency check behind the watcher
+NOTES_FULL_SCAN_INTERVAL_SECONDS = float(
+    os.environ.get("NOTES_FULL_SCAN_INTERVAL_SECONDS", str(6 * 60 * 60))
+)
+
+# parsing of new/changed notes is spread over a process pool; large PDFs are
+# split into page ranges of PDF_PAGES_PER_TASK pages
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "50"))
+CHUNK_INSERT_BATCH_SIZE = int(os.environ.get("CHUNK_INSERT_BATCH_SIZE", "500"))
+
+# semantic chunk index: vectors come from the OpenAI-compatible /embeddings
+# endpoint when EMBEDDING_MODEL_NAME is set, otherwise from a local hashing
+# vectorizer
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "")
+EMBEDDING_API_BASE = os.environ.get("EMBEDDING_API_BASE", LLM_API_BASE)
+EMBEDDING_INDEX_DIR = Path(
+    os.environ.get("EMBEDDING_INDEX_DIR", "./embedding_index")
+).expanduser()
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "float16")
+EMBEDDING_HASH_DIM = int(os.environ.get("EMBEDDING_HASH_DIM", "1024"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+
+# content-addressed cache of LLM card generations (llm_cache table)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_MAX_BYTES = int(
+    os.environ.get("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024))
+)
+LLM_CACHE_MAX_AGE_DAYS = float(os.environ.get("LLM_CACHE_MAX_AGE_DAYS", "30"))
+
+# generation planning: sources larger than the context window are split into
+# windows that are generated concurrently and merged
+LLM_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", "4096"))
+LLM_WINDOW_OUTPUT_TOKENS = int(os.environ.get("LLM_WINDOW_OUTPUT_TOKENS", "1024"))
+LLM_TOKENS_PER_CARD = int(os.environ.get("LLM_TOKENS_PER_CARD", "90"))
+LLM_GENERATION_CONCURRENCY = int(os.environ.get("LLM_GENERATION_CONCURRENCY", "2"))
+
+# background generation jobs (jobs.py): concurrent jobs, and how long finished
+# jobs are kept
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_RETENTION_DAYS = float(os.environ.get("JOB_RETENTION_DAYS", "7"))
+
+# opt-in idle-time pre-generation (pregen.py): draft cards for new or changed
+# chunks, generated once no user-driven generation has run for
+# PREGEN_IDLE_SECONDS
+PREGEN_ENABLED = os.environ.get("PREGEN_ENABLED", "0") == "1"
+PREGEN_IDLE_SECONDS = float(os.environ.get("PREGEN_IDLE_SECONDS", "30"))
+PREGEN_CARDS_PER_CHUNK = int(os.environ.get("PREGEN_CARDS_PER_CHUNK", "3"))
+PREGEN_MIN_CHUNK_CHARS = int(os.environ.get("PREGEN_MIN_CHUNK_CHARS", "200"))
+PREGEN_MAX_ATTEMPTS = int(os.environ.get("PREGEN_MAX_ATTEMPTS", "3"))
+
+# /api/review/summary is cached this long; reviews and card changes clear it
+REVIEW_SUMMARY_CACHE_SECONDS = float(
+    os.environ.get("REVIEW_SUMMARY_CACHE_SECONDS", "30")
+)
+
+# the in-memory review queue compares its size with the database this
+# often, reloading if they disagree
+REVIEW_QUEUE_CHECK_SECONDS = float(
+    os.environ.get("REVIEW_QUEUE_CHECK_SECONDS", "60")
+)
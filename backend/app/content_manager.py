@@ -1,14 +1,36 @@
 from __future__ import annotations
 
 import hashlib
+import logging
+import multiprocessing
+import os
+import stat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List
-
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from sqlalchemy import bindparam, delete, insert, or_, update
 from sqlmodel import Session, select
 
-from .models import Source, SourceChunk
-import fitz
+from .config import CHUNK_INSERT_BATCH_SIZE, PARSE_WORKERS, PDF_PAGES_PER_TASK
+from .models import Card, ScanManifestEntry, Source, SourceChunk
+
+logger = logging.getLogger(__name__)
+
+NOTE_SUFFIXES = {".md", ".pdf"}
 
 
 def compute_file_hash(path: Path) -> str:
@@ -19,6 +41,15 @@ def compute_file_hash(path: Path) -> str:
     return h.hexdigest()
 
 
+def chunk_fingerprint(kind: str, anchor: str, text: str) -> str:
+    """
+    Stable identity of a chunk: its kind, its position in the document (the
+    heading path for markdown sections) and a hash of its text.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{kind}\x1f{anchor}\x1f{text_hash}".encode("utf-8")).hexdigest()
+
+
 def deduce_markdown_title(path: Path) -> str:
     try:
         with path.open("r", encoding="utf-8") as f:
@@ -43,17 +74,23 @@ def parse_markdown_to_chunks(path: Path) -> List[dict]:
 
     chunks: List[dict] = []
     current_heading = "Document"
+    # (level, heading) of the current heading and its ancestors
+    heading_stack: List[Tuple[int, str]] = []
     current_lines: List[str] = []
 
     def flush() -> None:
         if current_lines:
             chunk_text = "\n".join(current_lines).strip()
             if chunk_text:
+                heading_path = " > ".join(h for _, h in heading_stack) or current_heading
                 chunks.append(
                     {
                         "kind": "markdown_section",
                         "loc": current_heading,
                         "text": chunk_text,
+                        "fingerprint": chunk_fingerprint(
+                            "markdown_section", heading_path, chunk_text
+                        ),
                     }
                 )
 
@@ -61,8 +98,12 @@ def parse_markdown_to_chunks(path: Path) -> List[dict]:
         stripped = line.lstrip()
         if stripped.startswith("#"):
             flush()
+            level = len(stripped) - len(stripped.lstrip("#"))
             heading_text = stripped.lstrip("#").strip()
             current_heading = heading_text or "Untitled section"
+            while heading_stack and heading_stack[-1][0] >= level:
+                heading_stack.pop()
+            heading_stack.append((level, current_heading))
             current_lines = []
         else:
             current_lines.append(line)
@@ -75,17 +116,28 @@ def parse_markdown_to_chunks(path: Path) -> List[dict]:
                 "kind": "markdown_document",
                 "loc": "whole_document",
                 "text": text.strip(),
+                "fingerprint": chunk_fingerprint(
+                    "markdown_document", "whole_document", text.strip()
+                ),
             }
         )
 
     return chunks
 
 
-def parse_pdf_to_chunks(path: Path) -> List[dict]:
+def parse_pdf_to_chunks(
+    path: Path, start_page: int = 0, end_page: Optional[int] = None
+) -> List[dict]:
+    """Parse pages [start_page, end_page) of a PDF, or all pages by default."""
+    # PyMuPDF takes longer to import than the rest of the app together;
+    # only load it once a PDF actually needs parsing
+    import fitz
+
     doc = fitz.open(path)
     chunks: List[dict] = []
     try:
-        for page_index in range(len(doc)):
+        stop = len(doc) if end_page is None else min(end_page, len(doc))
+        for page_index in range(start_page, stop):
             page = doc.load_page(page_index)
             text = page.get_text().strip()
             if text:
@@ -94,6 +146,9 @@ def parse_pdf_to_chunks(path: Path) -> List[dict]:
                         "kind": "pdf_page",
                         "loc": f"page={page_index + 1}",
                         "text": text,
+                        # content only, so pages keep their identity when
+                        # pages are inserted or removed before them
+                        "fingerprint": chunk_fingerprint("pdf_page", "", text),
                     }
                 )
     finally:
@@ -101,87 +156,505 @@ def parse_pdf_to_chunks(path: Path) -> List[dict]:
     return chunks
 
 
+def pdf_page_count(path: Path) -> int:
+    import fitz
+
+    doc = fitz.open(path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def _parse_tasks(path: Path) -> List[Tuple[Callable[..., List[dict]], tuple]]:
+    """Split parsing of one file into independent (function, args) tasks."""
+    if path.suffix.lower() == ".md":
+        return [(parse_markdown_to_chunks, (path,))]
+
+    page_count = pdf_page_count(path)
+    step = max(1, PDF_PAGES_PER_TASK)
+    return [
+        (parse_pdf_to_chunks, (path, start, start + step))
+        for start in range(0, page_count, step)
+    ] or [(parse_pdf_to_chunks, (path,))]
+
+
+def parse_note_files(
+    paths: Sequence[Path], workers: int = PARSE_WORKERS
+) -> Iterator[Tuple[int, List[dict]]]:
+    """
+    Parse files into chunk dicts, yielding (index into paths, chunks) as each
+    file completes. A file is fully parsed before it is yielded, so the
+    caller never holds a write transaction open while parsing runs.
+
+    Files, and page ranges of large PDFs, are parsed in parallel on a process
+    pool when there is more than one task and more than one worker. The
+    caller receives results in completion order and can write them to the DB
+    serially while the remaining files are still being parsed.
+
+    A file that fails to parse (e.g. a corrupt PDF) is logged and not
+    yielded.
+    """
+    file_tasks: Dict[int, List[Tuple[Callable[..., List[dict]], tuple]]] = {}
+    for i, path in enumerate(paths):
+        try:
+            file_tasks[i] = _parse_tasks(path)
+        except Exception:
+            logger.exception("Failed to parse %s, skipping it", path)
+    tasks = [
+        (i, part, fn, args)
+        for i, per_file in file_tasks.items()
+        for part, (fn, args) in enumerate(per_file)
+    ]
+
+    if workers <= 1 or len(tasks) <= 1:
+        for i, per_file in file_tasks.items():
+            try:
+                chunks = [cd for fn, args in per_file for cd in fn(*args)]
+            except Exception:
+                logger.exception("Failed to parse %s, skipping it", paths[i])
+                continue
+            yield i, chunks
+        return
+
+    parts_left: Dict[int, int] = {
+        i: len(per_file) for i, per_file in file_tasks.items()
+    }
+    parts: Dict[int, Dict[int, List[dict]]] = {i: {} for i in file_tasks}
+
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    try:
+        futures = {
+            pool.submit(fn, *args): (i, part) for i, part, fn, args in tasks
+        }
+        for future in as_completed(futures):
+            i, part = futures[future]
+            if i not in parts:
+                continue  # another part of this file failed
+            try:
+                parts[i][part] = future.result()
+            except Exception:
+                logger.exception("Failed to parse %s, skipping it", paths[i])
+                del parts[i]
+                continue
+            parts_left[i] -= 1
+            if parts_left[i] == 0:
+                file_parts = parts.pop(i)
+                yield i, [cd for key in sorted(file_parts) for cd in file_parts[key]]
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def is_note_file(name: str) -> bool:
+    return Path(name).suffix.lower() in NOTE_SUFFIXES
+
+
+def iter_note_files(
+    notes_root: Path, start: Optional[Path] = None
+) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """
+    Walk notes_root (or the subdirectory start) and yield (path relative to
+    notes_root, absolute path, stat) for every .md and .pdf file, costing a
+    single stat() call per file.
+    """
+    for dirpath, _dirnames, filenames in os.walk(start or notes_root):
+        for name in filenames:
+            if not is_note_file(name):
+                continue
+            path = Path(dirpath) / name
+            try:
+                st = path.stat()
+            except OSError:
+                # vanished or unreadable between listing and stat
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            yield str(path.relative_to(notes_root)), path, st
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _update_manifest(
+    session: Session,
+    src: Source,
+    entry: Optional[ScanManifestEntry],
+    stat_key: Tuple[int, int, int],
+) -> None:
+    if entry is None:
+        entry = ScanManifestEntry(source_id=src.id, size=0, mtime_ns=0, inode=0)
+    entry.size, entry.mtime_ns, entry.inode = stat_key
+    session.add(entry)
+
+
+def purge_source(session: Session, src: Source) -> None:
+    """
+    Delete a source whose file is gone, together with its chunks and manifest
+    entry. Cards generated from it are kept but lose their source links.
+    """
+    chunk_ids = select(SourceChunk.id).where(SourceChunk.source_id == src.id)
+    session.exec(
+        update(Card)
+        .where(or_(Card.source_id == src.id, Card.source_chunk_id.in_(chunk_ids)))
+        .values(source_id=None, source_chunk_id=None)
+    )
+    session.exec(delete(SourceChunk).where(SourceChunk.source_id == src.id))
+    session.exec(
+        delete(ScanManifestEntry).where(ScanManifestEntry.source_id == src.id)
+    )
+    session.delete(src)
+    session.commit()
+
+
+def load_chunk_texts(
+    session: Session, source_id: Optional[int], chunk_ids: Optional[List[int]]
+) -> List[str]:
+    """
+    Texts of a source's chunks (or of the selected chunk_ids), in document
+    order. Returns [] when there is no such source, and raises ValueError if
+    the source has none of the requested chunks.
+    """
+    source = session.get(Source, source_id) if source_id is not None else None
+    if source is None:
+        return []
+
+    stmt = select(SourceChunk.text).where(SourceChunk.source_id == source.id)
+    if chunk_ids:
+        stmt = stmt.where(SourceChunk.id.in_(chunk_ids))
+    texts = session.exec(stmt.order_by(SourceChunk.position, SourceChunk.id)).all()
+    if not texts:
+        raise ValueError("No chunks found for requested source")
+    return list(texts)
+
+
+def _write_source(
+    session: Session,
+    path: Path,
+    rel_path: str,
+    src: Optional[Source],
+    entry: Optional[ScanManifestEntry],
+    stat_key: Tuple[int, int, int],
+    file_hash: str,
+    chunk_dicts: Iterable[dict],
+) -> None:
+    """
+    Create or update a Source and bring its chunks in line with chunk_dicts,
+    in a single transaction. chunk_dicts must already be parsed: the write
+    lock is held from the first flush until the commit. New rows are
+    inserted in batches of CHUNK_INSERT_BATCH_SIZE rows.
+    """
+    suffix = path.suffix.lower()
+    is_new = src is None
+
+    if src is None:
+        # new source
+        if suffix == ".md":
+            title = deduce_markdown_title(path)
+            src_type = "markdown"
+        else:
+            title = path.stem
+            src_type = "pdf"
+
+        src = Source(
+            path=rel_path,
+            title=title,
+            type=src_type,
+            hash=file_hash,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+        session.add(src)
+        # flush (not commit) to get the id: the whole source is one transaction
+        session.flush()
+    else:
+        src.hash = file_hash
+        src.updated_at = datetime.utcnow()
+        if suffix == ".md":
+            src.title = deduce_markdown_title(path)
+            src.type = "markdown"
+        else:
+            src.title = path.stem
+            src.type = "pdf"
+        session.add(src)
+
+    if is_new:
+        _insert_chunks(session, src.id, enumerate(chunk_dicts))
+    else:
+        # keep ids of unchanged chunks so cards stay linked to them
+        _diff_chunks(session, src.id, chunk_dicts)
+
+    _update_manifest(session, src, entry, stat_key)
+    session.commit()
+
+
+def _insert_chunks(
+    session: Session, source_id: int, positioned: Iterable[Tuple[int, dict]]
+) -> int:
+    batch: List[dict] = []
+    inserted = 0
+    for position, cd in positioned:
+        batch.append(
+            {
+                "source_id": source_id,
+                "kind": cd["kind"],
+                "loc": cd["loc"],
+                "text": cd["text"],
+                "fingerprint": cd["fingerprint"],
+                "position": position,
+            }
+        )
+        if len(batch) >= CHUNK_INSERT_BATCH_SIZE:
+            session.execute(insert(SourceChunk.__table__), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        session.execute(insert(SourceChunk.__table__), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def _diff_chunks(session: Session, source_id: int, chunk_dicts: Iterable[dict]) -> None:
+    """
+    Reconcile the stored chunks of a source with freshly parsed chunk_dicts,
+    touching only what changed so that chunk ids (and the cards linked to
+    them) survive edits elsewhere in the document:
+
+    1. chunks whose fingerprint is unchanged keep their row; only their
+       position/loc is updated if they moved
+    2. remaining new chunks with the same kind and loc as a remaining old
+       chunk (a section or page whose text was edited) update that row
+    3. everything else is deleted or inserted
+    """
+    old_rows = session.exec(
+        select(
+            SourceChunk.id,
+            SourceChunk.kind,
+            SourceChunk.loc,
+            SourceChunk.fingerprint,
+            SourceChunk.position,
+        )
+        .where(SourceChunk.source_id == source_id)
+        .order_by(SourceChunk.position, SourceChunk.id)
+    ).all()
+
+    by_fingerprint: Dict[str, Deque[Tuple[int, str, int]]] = {}
+    for chunk_id, _kind, loc, fingerprint, position in old_rows:
+        if fingerprint:
+            by_fingerprint.setdefault(fingerprint, deque()).append(
+                (chunk_id, loc, position)
+            )
+
+    matched: Set[int] = set()
+    moved: List[dict] = []
+    unmatched_new: List[Tuple[int, dict]] = []
+    for position, cd in enumerate(chunk_dicts):
+        candidates = by_fingerprint.get(cd["fingerprint"])
+        if candidates:
+            chunk_id, loc, old_position = candidates.popleft()
+            matched.add(chunk_id)
+            if loc != cd["loc"] or old_position != position:
+                moved.append({"_id": chunk_id, "loc": cd["loc"], "position": position})
+        else:
+            unmatched_new.append((position, cd))
+
+    by_anchor: Dict[Tuple[str, str], Deque[int]] = {}
+    for chunk_id, kind, loc, _fingerprint, _position in old_rows:
+        if chunk_id not in matched:
+            by_anchor.setdefault((kind, loc), deque()).append(chunk_id)
+
+    edited: List[dict] = []
+    inserted: List[Tuple[int, dict]] = []
+    for position, cd in unmatched_new:
+        candidates = by_anchor.get((cd["kind"], cd["loc"]))
+        if candidates:
+            chunk_id = candidates.popleft()
+            matched.add(chunk_id)
+            edited.append(
+                {
+                    "_id": chunk_id,
+                    "text": cd["text"],
+                    "fingerprint": cd["fingerprint"],
+                    "position": position,
+                }
+            )
+        else:
+            inserted.append((position, cd))
+
+    removed = [row[0] for row in old_rows if row[0] not in matched]
+
+    table = SourceChunk.__table__
+    if moved:
+        session.execute(
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values(loc=bindparam("loc"), position=bindparam("position")),
+            moved,
+        )
+    if edited:
+        session.execute(
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values(
+                text=bindparam("text"),
+                fingerprint=bindparam("fingerprint"),
+                position=bindparam("position"),
+            ),
+            edited,
+        )
+    for start in range(0, len(removed), CHUNK_INSERT_BATCH_SIZE):
+        ids = removed[start : start + CHUNK_INSERT_BATCH_SIZE]
+        session.exec(
+            update(Card).where(Card.source_chunk_id.in_(ids)).values(source_chunk_id=None)
+        )
+        session.exec(delete(SourceChunk).where(SourceChunk.id.in_(ids)))
+    _insert_chunks(session, source_id, inserted)
+
+    logger.debug(
+        "Source %s chunks: %s unchanged, %s moved, %s edited, %s removed, %s inserted",
+        source_id,
+        len(matched) - len(edited) - len(moved),
+        len(moved),
+        len(edited),
+        len(removed),
+        len(inserted),
+    )
+
+
+def _ingest_changed(
+    session: Session,
+    changed: List[Tuple[str, Path, os.stat_result]],
+    known: Dict[str, Tuple[Source, Optional[ScanManifestEntry]]],
+) -> int:
+    """
+    Ingest files whose stat no longer matches the manifest. Files are hashed
+    first; those whose content really changed are parsed (in parallel, see
+    parse_note_files) and written to the DB one at a time in this process.
+    A file that cannot be parsed is logged and skipped, leaving its source
+    as it was. Returns number of sources processed (created or updated).
+    """
+    to_parse: List[Tuple[str, Path, Tuple[int, int, int], str]] = []
+    for rel_path, path, st in changed:
+        src, entry = known.get(rel_path, (None, None))
+        stat_key = _stat_key(st)
+        if entry is not None and (entry.size, entry.mtime_ns, entry.inode) == stat_key:
+            continue
+
+        file_hash = compute_file_hash(path)
+        if src is not None and src.hash == file_hash:
+            # touched, moved or copied back in place: content is unchanged
+            _update_manifest(session, src, entry, stat_key)
+            session.commit()
+            continue
+        to_parse.append((rel_path, path, stat_key, file_hash))
+
+    processed = 0
+    paths = [path for _rel, path, _key, _hash in to_parse]
+    for i, chunk_dicts in parse_note_files(paths):
+        rel_path, path, stat_key, file_hash = to_parse[i]
+        src, entry = known.get(rel_path, (None, None))
+        _write_source(
+            session, path, rel_path, src, entry, stat_key, file_hash, chunk_dicts
+        )
+        processed += 1
+
+    return processed
+
+
 def scan_notes_root(session: Session, notes_root: Path) -> int:
     """
     Scan notes_root for .md and .pdf files, update/create Source and
     SourceChunk entries. Returns number of sources processed (created or updated).
+
+    Files whose size, mtime and inode match the scan manifest are skipped
+    without being read, and sources whose file no longer exists are purged.
     """
     if not notes_root.exists():
         raise RuntimeError(f"Notes root does not exist: {notes_root}")
 
-    processed = 0
+    rows = session.exec(
+        select(Source, ScanManifestEntry).outerjoin(
+            ScanManifestEntry, ScanManifestEntry.source_id == Source.id
+        )
+    ).all()
+    known: Dict[str, Tuple[Source, Optional[ScanManifestEntry]]] = {
+        src.path: (src, entry) for src, entry in rows
+    }
 
-    for path in notes_root.rglob("*"):
-        if not path.is_file():
-            continue
+    seen: Set[str] = set()
+    changed: List[Tuple[str, Path, os.stat_result]] = []
 
-        suffix = path.suffix.lower()
-        if suffix not in {".md", ".pdf"}:
-            continue
+    for rel_path, path, st in iter_note_files(notes_root):
+        seen.add(rel_path)
+        changed.append((rel_path, path, st))
 
-        rel_path = str(path.relative_to(notes_root))
-        file_hash = compute_file_hash(path)
+    processed = _ingest_changed(session, changed, known)
 
-        statement = select(Source).where(Source.path == rel_path)
-        src = session.exec(statement).first()
+    for rel_path, (src, _entry) in known.items():
+        if rel_path not in seen:
+            purge_source(session, src)
 
-        if src is not None and src.hash == file_hash:
-            continue
+    return processed
 
-        if src is None:
-            # new source
-            if suffix == ".md":
-                title = deduce_markdown_title(path)
-                src_type = "markdown"
-            else:
-                title = path.stem
-                src_type = "pdf"
-
-            src = Source(
-                path=rel_path,
-                title=title,
-                type=src_type,
-                hash=file_hash,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
-            session.add(src)
-            session.commit()
-            session.refresh(src)
-        else:
-            src.hash = file_hash
-            src.updated_at = datetime.utcnow()
-            if suffix == ".md":
-                src.title = deduce_markdown_title(path)
-                src.type = "markdown"
-            else:
-                src.title = path.stem
-                src.type = "pdf"
-            session.add(src)
-            session.commit()
 
-            # remove existing chunks
-            existing_chunks = session.exec(select(SourceChunk).where(SourceChunk.source_id == src.id)).all()
-            for ch in existing_chunks:
-                session.delete(ch)
-            session.commit()
+def ingest_paths(session: Session, notes_root: Path, rel_paths: Iterable[str]) -> int:
+    """
+    Bring only the given paths (relative to notes_root) up to date, as
+    reported by the notes watcher. A path may name a file or a directory;
+    sources at or below paths that no longer exist are purged, so a directory
+    that was deleted or moved away loses its sources. Returns number of
+    sources processed (created or updated).
+    """
+    if not notes_root.exists():
+        raise RuntimeError(f"Notes root does not exist: {notes_root}")
 
-        # parse and add new chunks
-        if suffix == ".md":
-            chunk_dicts = parse_markdown_to_chunks(path)
-        else:
-            chunk_dicts = parse_pdf_to_chunks(path)
-
-        for cd in chunk_dicts:
-            chunk = SourceChunk(
-                source_id=src.id,
-                kind=cd["kind"],
-                loc=cd["loc"],
-                text=cd["text"],
-            )
-            session.add(chunk)
+    found: Dict[str, Tuple[Path, os.stat_result]] = {}
+    conditions = []
+    for rel in set(rel_paths):
+        path = notes_root / rel
+        below = Source.path.startswith(rel.rstrip(os.sep) + os.sep, autoescape=True)
+        if path.is_dir():
+            for file_rel, file_path, st in iter_note_files(notes_root, path):
+                found[file_rel] = (file_path, st)
+            conditions.append(below)
+            continue
 
-        session.commit()
-        processed += 1
+        if not is_note_file(rel):
+            if not os.path.lexists(path):
+                # a directory that was deleted or moved away
+                conditions.append(below)
+            continue
+        conditions.append(Source.path == rel)
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            found[rel] = (path, st)
+
+    if not conditions:
+        return 0
+
+    rows = session.exec(
+        select(Source, ScanManifestEntry)
+        .outerjoin(ScanManifestEntry, ScanManifestEntry.source_id == Source.id)
+        .where(or_(*conditions))
+    ).all()
+    known: Dict[str, Tuple[Source, Optional[ScanManifestEntry]]] = {
+        src.path: (src, entry) for src, entry in rows
+    }
+
+    processed = _ingest_changed(
+        session,
+        [(rel_path, path, st) for rel_path, (path, st) in found.items()],
+        known,
+    )
+
+    for rel_path, (src, _entry) in known.items():
+        if rel_path not in found:
+            purge_source(session, src)
 
     return processed
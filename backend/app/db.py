@@ -1,14 +1,72 @@
-from typing import Generator
+from typing import Generator, List
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 from sqlmodel import SQLModel, Session, create_engine
 
-from .config import DATABASE_URL
-
-engine = create_engine(
-    DATABASE_URL, echo=False, connect_args={"check_same_thread": False}
+from .config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_MB,
+    SQLITE_MMAP_SIZE_MB,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_WAL,
 )
 
 
+def sqlite_pragmas() -> List[str]:
+    """The PRAGMAs run on every new SQLite connection."""
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        # negative cache_size is in KiB
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_MB * 1024}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if SQLITE_WAL:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def create_db_engine(url: str = DATABASE_URL, tuned: bool = True) -> Engine:
+    """
+    Engine for url. SQLite file databases get a sized connection pool and,
+    with tuned, the sqlite_pragmas() profile on each connection.
+    """
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(url, echo=False, pool_pre_ping=True)
+
+    kwargs = {}
+    if make_url(url).database not in (None, "", ":memory:"):
+        kwargs = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+            "pool_pre_ping": True,
+        }
+    new_engine = create_engine(
+        url, echo=False, connect_args={"check_same_thread": False}, **kwargs
+    )
+    if tuned:
+        pragmas = sqlite_pragmas()
+
+        @event.listens_for(new_engine, "connect")
+        def _configure(dbapi_conn, _record) -> None:
+            cursor = dbapi_conn.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return new_engine
+
+
+engine = create_db_engine()
+
+
 def get_session() -> Generator[Session, None, None]:
     """FastAPI dependency that yields a DB session."""
     with Session(engine) as session:
@@ -17,5 +75,9 @@ def get_session() -> Generator[Session, None, None]:
 
 def init_db() -> None:
     from . import models
+    from .migrations import run_migrations
+    from .search_index import ensure_fts_index
 
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    ensure_fts_index(engine)
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlmodel import Session, select
+
+from .config import (
+    EMBEDDING_API_BASE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DTYPE,
+    EMBEDDING_HASH_DIM,
+    EMBEDDING_INDEX_DIR,
+    EMBEDDING_MODEL_NAME,
+)
+from .db import engine
+from .llm_client import get_http_client
+from .models import SourceChunk
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# rows scored per matrix product during search; bounds the float32 copy of a
+# float16 memmap block to BLOCK_ROWS * dim * 4 bytes
+BLOCK_ROWS = 65536
+# rewrite the vector file once this fraction of rows are dead
+COMPACT_RATIO = 0.3
+# characters of chunk text sent to the embedding model
+MAX_EMBED_CHARS = 8000
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _fingerprint_key(fingerprint: str) -> int:
+    """64-bit key of a chunk fingerprint, used to detect edited chunks."""
+    if not fingerprint:
+        return 0
+    return int(fingerprint[:15], 16)
+
+
+def hashing_embed(texts: Sequence[str], dim: int = EMBEDDING_HASH_DIM) -> np.ndarray:
+    """
+    Local fallback embedding: signed feature hashing of unigrams and bigrams
+    with sublinear (1 + log tf) weights, L2-normalised. No model or corpus
+    statistics are needed, so vectors stay valid as the corpus grows.
+    """
+    import numpy as np
+
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [w.lower() for w in _WORD_RE.findall(text)]
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for feature, count in features.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            out[row, h % dim] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+async def remote_embed(texts: Sequence[str]) -> np.ndarray:
+    """Embed texts with the OpenAI-compatible /embeddings endpoint."""
+    import numpy as np
+
+    payload = {
+        "model": EMBEDDING_MODEL_NAME,
+        "input": [t[:MAX_EMBED_CHARS] for t in texts],
+    }
+    client = await get_http_client()
+    try:
+        resp = await client.post(
+            f"{EMBEDDING_API_BASE}/embeddings",
+            json=payload,
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+    except httpx.RequestError as e:
+        raise RuntimeError(f"Embedding request failed: {e}") from e
+
+    resp.raise_for_status()
+    try:
+        data = sorted(resp.json()["data"], key=lambda item: item["index"])
+        vectors = np.asarray([item["embedding"] for item in data], dtype=np.float32)
+    except (KeyError, TypeError, ValueError) as e:
+        raise RuntimeError(f"Unexpected embedding response structure: {e}") from e
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+async def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    if EMBEDDING_MODEL_NAME:
+        return await remote_embed(texts)
+    # CPU-bound: keep it off the event loop
+    return await asyncio.to_thread(hashing_embed, texts)
+
+
+def embedding_model_id() -> str:
+    return EMBEDDING_MODEL_NAME or f"hashing-{EMBEDDING_HASH_DIM}"
+
+
+class EmbeddingIndex:
+    """
+    Append-only, memory-mapped vector index over SourceChunk.
+
+    Files in directory:
+      meta.json    model, dim, dtype and row count
+      vectors.bin  row-major count x dim matrix of dtype, one row per chunk
+      ids.npy      chunk id per row, -1 for rows of deleted/edited chunks
+      keys.npy     fingerprint key per row, to notice in-place edits
+
+    sync() appends vectors for new or edited chunks and marks rows of
+    removed ones dead; the vector file is only rewritten when enough rows are
+    dead. search() scores blocks of the memmap with a matrix product.
+    """
+
+    def __init__(self, directory: Path, dtype: str = EMBEDDING_DTYPE) -> None:
+        self.directory = directory
+        self._dtype_name = dtype
+        self._lock = asyncio.Lock()
+        # guards the loaded state below, read by searches in worker threads
+        self._state_lock = threading.Lock()
+        self._meta: Optional[dict] = None
+        self._ids: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None
+        self._vectors: Optional[np.memmap] = None
+
+    @property
+    def dtype(self) -> np.dtype:
+        import numpy as np
+
+        return np.dtype(self._dtype_name)
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.bin"
+
+    def _load(self) -> None:
+        import numpy as np
+
+        if self._meta is not None:
+            return
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text())
+        if meta.get("model") != embedding_model_id() or meta.get("dtype") != self.dtype.name:
+            logger.info("Embedding model or dtype changed, rebuilding index")
+            return
+        self._meta = meta
+        self._ids = np.load(self.directory / "ids.npy")
+        self._keys = np.load(self.directory / "keys.npy")
+        self._vectors = None
+
+    def _matrix(self) -> Optional[np.memmap]:
+        import numpy as np
+
+        if self._meta is None or self._meta["count"] == 0:
+            return None
+        if self._vectors is None:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._meta["count"], self._meta["dim"]),
+            )
+        return self._vectors
+
+    def _save(self, ids: np.ndarray, keys: np.ndarray, dim: int) -> None:
+        import numpy as np
+
+        meta = {
+            "model": embedding_model_id(),
+            "dim": dim,
+            "dtype": self.dtype.name,
+            "count": int(len(ids)),
+        }
+        for name, arr in (("ids.npy", ids), ("keys.npy", keys)):
+            tmp = self.directory / f"{name}.tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, self.directory / name)
+        tmp = self.directory / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.directory / "meta.json")
+
+        self._meta, self._ids, self._keys, self._vectors = meta, ids, keys, None
+
+    def _compact(self) -> None:
+        import numpy as np
+
+        assert self._meta is not None and self._ids is not None
+        live = np.flatnonzero(self._ids >= 0)
+        dim = self._meta["dim"]
+        matrix = self._matrix()
+        tmp = self.directory / "vectors.bin.tmp"
+        with tmp.open("wb") as f:
+            for start in range(0, len(live), BLOCK_ROWS):
+                if matrix is not None:
+                    f.write(np.ascontiguousarray(matrix[live[start : start + BLOCK_ROWS]]).tobytes())
+        with self._state_lock:
+            self._vectors = None
+            os.replace(tmp, self._vectors_path)
+            self._save(self._ids[live], self._keys[live], dim)
+
+    async def sync(self, session: Session) -> Tuple[int, int]:
+        """
+        Bring the index in line with the source_chunks table. Returns the
+        number of (added, removed) rows.
+
+        Reading chunks, embedding and file I/O run in worker threads, one
+        batch of EMBEDDING_BATCH_SIZE at a time, so the event loop keeps
+        serving requests during a large sync.
+        """
+        async with self._lock:
+            current, ids, keys, dim, removed, missing = await asyncio.to_thread(
+                self._plan_sync, session
+            )
+
+            new_ids: List[int] = []
+            new_keys: List[int] = []
+            for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+                batch = missing[start : start + EMBEDDING_BATCH_SIZE]
+                rows = await asyncio.to_thread(self._chunk_texts, session, batch)
+                vectors = await embed_texts([text for _id, text in rows])
+                if dim and vectors.shape[1] != dim:
+                    raise RuntimeError(
+                        f"Embedding dimension changed from {dim} to {vectors.shape[1]}"
+                    )
+                dim = vectors.shape[1]
+                await asyncio.to_thread(self._append, vectors)
+                new_ids.extend(chunk_id for chunk_id, _text in rows)
+                new_keys.extend(current[chunk_id] for chunk_id, _text in rows)
+
+            if removed or new_ids or self._meta is None:
+                await asyncio.to_thread(self._finish_sync, ids, keys, new_ids, new_keys, dim)
+
+            if removed or new_ids:
+                logger.info(
+                    "Embedding index synced: %s added, %s removed", len(new_ids), removed
+                )
+            return len(new_ids), removed
+
+    def _plan_sync(
+        self, session: Session
+    ) -> Tuple[Dict[int, int], np.ndarray, np.ndarray, int, int, List[int]]:
+        """
+        Compare the index with the chunks table: returns the current
+        fingerprint keys, the row ids (rows of removed or edited chunks set
+        to -1) and keys, dim, the number of rows removed and the chunk ids
+        to embed.
+        """
+        import numpy as np
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._state_lock:
+            self._load()
+
+        current: Dict[int, int] = {
+            chunk_id: _fingerprint_key(fingerprint)
+            for chunk_id, fingerprint in session.exec(
+                select(SourceChunk.id, SourceChunk.fingerprint)
+            ).all()
+        }
+
+        if self._meta is None:
+            ids = np.empty(0, dtype=np.int64)
+            keys = np.empty(0, dtype=np.int64)
+            self._vectors_path.write_bytes(b"")
+            dim = 0
+        else:
+            ids, keys, dim = self._ids.copy(), self._keys, self._meta["dim"]
+            # drop vectors appended by a sync that failed before saving
+            with self._vectors_path.open("r+b") as f:
+                f.truncate(len(ids) * dim * self.dtype.itemsize)
+
+        indexed: Dict[int, int] = {}
+        removed = 0
+        for row in np.flatnonzero(ids >= 0):
+            chunk_id = int(ids[row])
+            if current.get(chunk_id) != int(keys[row]):
+                ids[row] = -1
+                removed += 1
+            else:
+                indexed[chunk_id] = row
+
+        missing = [chunk_id for chunk_id in current if chunk_id not in indexed]
+        return current, ids, keys, dim, removed, missing
+
+    def _chunk_texts(self, session: Session, chunk_ids: List[int]) -> List[Tuple[int, str]]:
+        return list(
+            session.exec(
+                select(SourceChunk.id, SourceChunk.text).where(
+                    SourceChunk.id.in_(chunk_ids)
+                )
+            ).all()
+        )
+
+    def _append(self, vectors: np.ndarray) -> None:
+        with self._vectors_path.open("ab") as f:
+            f.write(vectors.astype(self.dtype).tobytes())
+
+    def _finish_sync(
+        self,
+        ids: np.ndarray,
+        keys: np.ndarray,
+        new_ids: List[int],
+        new_keys: List[int],
+        dim: int,
+    ) -> None:
+        import numpy as np
+
+        with self._state_lock:
+            self._save(
+                np.concatenate([ids, np.asarray(new_ids, dtype=np.int64)]),
+                np.concatenate([keys, np.asarray(new_keys, dtype=np.int64)]),
+                dim,
+            )
+            dead = int(np.count_nonzero(self._ids < 0))
+        if dead and dead >= COMPACT_RATIO * len(self._ids):
+            self._compact()
+
+    def search_vectors(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k (chunk id, cosine similarity) for each row of queries, computed
+        block by block as queries @ block.T.
+        """
+        import numpy as np
+
+        with self._state_lock:
+            self._load()
+            matrix = self._matrix()
+            ids = self._ids
+        if matrix is None or ids is None:
+            return [[] for _ in range(len(queries))]
+
+        queries = np.asarray(queries, dtype=np.float32)
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((n_queries, 0), dtype=np.int64)
+
+        for start in range(0, len(matrix), BLOCK_ROWS):
+            block = np.asarray(matrix[start : start + BLOCK_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            scores[:, ids[start : start + len(block)] < 0] = -np.inf
+
+            block_rows = np.arange(start, start + len(block))
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(block_rows, (n_queries, len(block)))],
+                axis=1,
+            )
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        results: List[List[Tuple[int, float]]] = []
+        for q in range(n_queries):
+            order = np.argsort(-best_scores[q])
+            results.append(
+                [
+                    (int(ids[best_rows[q, i]]), float(best_scores[q, i]))
+                    for i in order
+                    if np.isfinite(best_scores[q, i])
+                ]
+            )
+        return results
+
+    async def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        vectors = await embed_texts([query])
+        return (await asyncio.to_thread(self.search_vectors, vectors, k))[0]
+
+
+index = EmbeddingIndex(EMBEDDING_INDEX_DIR)
+
+_sync_task: Optional[asyncio.Task[None]] = None
+_sync_requested = False
+
+
+async def _run_sync() -> None:
+    global _sync_requested
+    while _sync_requested:
+        _sync_requested = False
+        try:
+            with Session(engine) as session:
+                await index.sync(session)
+        except Exception:
+            logger.exception("Failed to update embedding index")
+
+
+def request_sync() -> None:
+    """
+    Schedule a background sync after chunks changed. Requests made while a
+    sync is running are coalesced into one more pass.
+    """
+    global _sync_task, _sync_requested
+    _sync_requested = True
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.create_task(_run_sync())
+
+
+async def stop_sync() -> None:
+    if _sync_task is not None and not _sync_task.done():
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Set
+
+from .config import (
+    LLM_CONTEXT_TOKENS,
+    LLM_GENERATION_CONCURRENCY,
+    LLM_TOKENS_PER_CARD,
+    LLM_WINDOW_OUTPUT_TOKENS,
+)
+from .llm_client import (
+    build_card_messages,
+    call_llm_for_cards,
+    count_tokens,
+    stream_llm_cards,
+)
+
+logger = logging.getLogger(__name__)
+
+# chat template tokens added around each message
+TOKENS_PER_MESSAGE = 8
+# separator between chunks inside a window
+SEPARATOR = "\n\n"
+# fill split pieces of oversized chunks to this share of the budget, since
+# their token counts are estimated from the chunk's tokens-per-character
+SPLIT_FILL = 0.9
+# bounded memo of token counts, keyed by text hash
+_TOKEN_CACHE_SIZE = 50_000
+_token_cache: Dict[str, int] = {}
+
+
+@dataclass
+class GenerationWindow:
+    """A group of consecutive chunks that fits in one LLM request."""
+
+    texts: List[str] = field(default_factory=list)
+    tokens: int = 0
+    num_cards: int = 0
+    max_tokens: int = 0
+
+    @property
+    def text(self) -> str:
+        return "\n" + SEPARATOR.join(self.texts)
+
+
+async def _cached_token_count(text: str) -> int:
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    count = _token_cache.get(key)
+    if count is None:
+        count = await count_tokens(text)
+        if len(_token_cache) >= _TOKEN_CACHE_SIZE:
+            _token_cache.clear()
+        _token_cache[key] = count
+    return count
+
+
+async def _count_all(texts: Sequence[str]) -> List[int]:
+    sem = asyncio.Semaphore(8)
+
+    async def one(text: str) -> int:
+        async with sem:
+            return await _cached_token_count(text)
+
+    return list(await asyncio.gather(*(one(t) for t in texts)))
+
+
+def _split_text(text: str, tokens: int, budget: int) -> List[str]:
+    """
+    Split a chunk that alone exceeds budget into pieces that fit, breaking at
+    paragraphs, then lines, then anywhere.
+    """
+    max_chars = max(1, int(len(text) / tokens * budget * SPLIT_FILL))
+    pieces: List[str] = []
+    current = ""
+    for para in re.split(r"(\n\s*\n)", text):
+        if len(current) + len(para) <= max_chars:
+            current += para
+            continue
+        if current.strip():
+            pieces.append(current.strip())
+        current = ""
+        for line in para.splitlines(keepends=True):
+            while len(line) > max_chars:
+                pieces.append(line[:max_chars])
+                line = line[max_chars:]
+            if len(current) + len(line) > max_chars:
+                if current.strip():
+                    pieces.append(current.strip())
+                current = ""
+            current += line
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def _allocate_cards(windows: List[GenerationWindow], num_cards: int) -> None:
+    """
+    Spread num_cards over windows in proportion to their size (largest
+    remainder), never giving a window more cards than its output budget
+    holds. Windows may get zero cards if num_cards < len(windows).
+    """
+    caps = [max(1, w.max_tokens // LLM_TOKENS_PER_CARD) for w in windows]
+    total_tokens = sum(w.tokens for w in windows) or 1
+    shares = [num_cards * w.tokens / total_tokens for w in windows]
+    for w, share, cap in zip(windows, shares, caps):
+        w.num_cards = min(int(share), cap)
+
+    remaining = num_cards - sum(w.num_cards for w in windows)
+    order = sorted(
+        range(len(windows)),
+        key=lambda i: (shares[i] - int(shares[i]), windows[i].tokens),
+        reverse=True,
+    )
+    while remaining > 0:
+        progressed = False
+        for i in order:
+            if remaining == 0:
+                break
+            if windows[i].num_cards < caps[i]:
+                windows[i].num_cards += 1
+                remaining -= 1
+                progressed = True
+        if not progressed:
+            break
+
+
+async def plan_generation(
+    texts: Sequence[str], instructions: Optional[str], num_cards: int
+) -> List[GenerationWindow]:
+    """
+    Pack chunk texts, in order, into windows that fit the model context
+    together with the prompt and the output budget, and decide how many cards
+    each window should produce.
+    """
+    messages = build_card_messages("", instructions, num_cards)
+    overhead = await count_tokens("".join(m["content"] for m in messages))
+    overhead += TOKENS_PER_MESSAGE * len(messages)
+    budget = LLM_CONTEXT_TOKENS - overhead - LLM_WINDOW_OUTPUT_TOKENS
+    if budget < 128:
+        raise RuntimeError(
+            "Prompt and instructions leave no room for source text in the "
+            f"{LLM_CONTEXT_TOKENS}-token model context"
+        )
+
+    windows: List[GenerationWindow] = []
+    current = GenerationWindow()
+    counts = await _count_all(texts)
+    for text, tokens in zip(texts, counts):
+        pieces = [(text, tokens)]
+        if tokens > budget:
+            pieces = [
+                (piece, await _cached_token_count(piece))
+                for piece in _split_text(text, tokens, budget)
+            ]
+        for piece, piece_tokens in pieces:
+            cost = piece_tokens + (1 if current.texts else 0)
+            if current.texts and current.tokens + cost > budget:
+                windows.append(current)
+                current = GenerationWindow()
+                cost = piece_tokens
+            current.texts.append(piece)
+            current.tokens += cost
+    if current.texts or not windows:
+        windows.append(current)
+
+    for w in windows:
+        w.max_tokens = LLM_CONTEXT_TOKENS - overhead - w.tokens
+    _allocate_cards(windows, num_cards)
+
+    if len(windows) > 1:
+        logger.info(
+            "Generation planned: %s windows, cards per window %s",
+            len(windows),
+            [w.num_cards for w in windows],
+        )
+    return [w for w in windows if w.num_cards > 0]
+
+
+def _dedupe_key(card: dict) -> str:
+    return " ".join(re.findall(r"\w+", card["front"].lower()))
+
+
+def merge_cards(card_lists: Sequence[Sequence[dict]]) -> List[dict]:
+    """Concatenate per-window results, dropping cards with the same question."""
+    seen: Set[str] = set()
+    merged: List[dict] = []
+    for cards in card_lists:
+        for card in cards:
+            key = _dedupe_key(card)
+            if key not in seen:
+                seen.add(key)
+                merged.append(card)
+    return merged
+
+
+async def generate_cards_planned(
+    texts: Sequence[str],
+    instructions: Optional[str],
+    num_cards: int,
+    temperature: float,
+    use_cache: bool = True,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[dict]:
+    """
+    Generate num_cards cards from chunk texts of any size: windows are run
+    concurrently (up to LLM_GENERATION_CONCURRENCY) and their cards merged.
+    Fails only if every window fails. on_progress(done, total) is called as
+    windows finish.
+    """
+    windows = await plan_generation(texts, instructions, num_cards)
+    sem = asyncio.Semaphore(LLM_GENERATION_CONCURRENCY)
+    finished = 0
+    if on_progress is not None:
+        on_progress(0, len(windows))
+
+    async def run(w: GenerationWindow) -> List[dict]:
+        nonlocal finished
+        async with sem:
+            try:
+                return await call_llm_for_cards(
+                    w.text,
+                    instructions,
+                    w.num_cards,
+                    temperature,
+                    use_cache=use_cache,
+                    max_tokens=w.max_tokens,
+                )
+            finally:
+                finished += 1
+                if on_progress is not None:
+                    on_progress(finished, len(windows))
+
+    results = await asyncio.gather(*(run(w) for w in windows), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    card_lists = [r for r in results if not isinstance(r, BaseException)]
+    if not card_lists:
+        raise errors[0]
+    for e in errors:
+        logger.warning("Generation window failed: %s", e)
+    return merge_cards(card_lists)
+
+
+async def stream_cards_planned(
+    texts: Sequence[str],
+    instructions: Optional[str],
+    num_cards: int,
+    temperature: float,
+    use_cache: bool = True,
+) -> AsyncIterator[dict]:
+    """Streaming variant of generate_cards_planned, yielding cards as they complete."""
+    windows = await plan_generation(texts, instructions, num_cards)
+    sem = asyncio.Semaphore(LLM_GENERATION_CONCURRENCY)
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def run(w: GenerationWindow) -> None:
+        try:
+            async with sem:
+                async for card in stream_llm_cards(
+                    w.text,
+                    instructions,
+                    w.num_cards,
+                    temperature,
+                    use_cache=use_cache,
+                    max_tokens=w.max_tokens,
+                ):
+                    await queue.put(card)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.create_task(run(w)) for w in windows]
+    seen: Set[str] = set()
+    errors: List[Exception] = []
+    finished = 0
+    try:
+        while finished < len(tasks):
+            item = await queue.get()
+            if item is done:
+                finished += 1
+            elif isinstance(item, Exception):
+                logger.warning("Generation window failed: %s", item)
+                errors.append(item)
+            else:
+                key = _dedupe_key(item)
+                if key not in seen:
+                    seen.add(key)
+                    yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not seen and errors:
+        raise errors[0]
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .admission import admission
+from .config import JOB_RETENTION_DAYS, JOB_WORKERS
+from .content_manager import load_chunk_texts
+from .db import engine
+from .generation_planner import generate_cards_planned
+from .llm_client import interactive_use
+from .models import GenerationJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+# lower runs first
+PRIORITY_RANK = {"interactive": 0, "bulk": 1}
+
+# jobs share one admission queue entry, so they take turns with API callers
+JOBS_CLIENT_ID = "jobs"
+
+
+def job_snapshot(job: GenerationJob) -> dict:
+    """Public view of a job, as returned by the API and sent to subscribers."""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        "progress_done": job.progress_done,
+        "progress_total": job.progress_total,
+        "cards": json.loads(job.result) if job.result is not None else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobManager:
+    """
+    Runs card generation jobs on a fixed pool of worker tasks, interactive
+    jobs before bulk ones. Job state lives in the generation_jobs table:
+    jobs that were queued or running when the server stopped are picked up
+    again on start.
+
+    Job rows are read and written in worker threads (asyncio.to_thread); the
+    priority queue, task cancellation and subscriber fan-out stay on the
+    event loop, as none of them are thread-safe. submit() and cancel() must
+    therefore be awaited on the loop.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._worker_tasks: List[asyncio.Task[None]] = []
+        self._running: Dict[str, asyncio.Task[None]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._queue = asyncio.PriorityQueue()
+        self._stopping = False
+        pending = await asyncio.to_thread(self._recover)
+        for job in pending:
+            self._enqueue(job)
+        if pending:
+            logger.info("Resuming %s generation jobs", len(pending))
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    def _recover(self) -> List[GenerationJob]:
+        """Drop expired finished jobs; requeue the queued and interrupted ones."""
+        cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+        with Session(engine) as session:
+            session.exec(
+                delete(GenerationJob).where(
+                    GenerationJob.status.in_(FINISHED),
+                    GenerationJob.finished_at < cutoff,
+                )
+            )
+            pending = session.exec(
+                select(GenerationJob)
+                .where(GenerationJob.status.in_([QUEUED, RUNNING]))
+                .order_by(GenerationJob.created_at)
+            ).all()
+            for job in pending:
+                # interrupted mid-run: start over
+                job.status = QUEUED
+                job.started_at = None
+                job.progress_done = 0
+                session.add(job)
+            session.commit()
+            for job in pending:
+                session.refresh(job)
+        return list(pending)
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs go back to queued for the next start."""
+        self._stopping = True
+        tasks = list(self._running.values()) + self._worker_tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks.clear()
+        self._running.clear()
+
+    async def submit(
+        self, request: dict, priority: str = "interactive"
+    ) -> GenerationJob:
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            priority=priority,
+            request=json.dumps(request),
+        )
+        job = await asyncio.to_thread(self._insert, job)
+        self._enqueue(job)
+        return job
+
+    def _insert(self, job: GenerationJob) -> GenerationJob:
+        with Session(engine) as session:
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        """Blocking; from async code, call via asyncio.to_thread."""
+        with Session(engine) as session:
+            return session.get(GenerationJob, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[GenerationJob]:
+        """
+        Cancel a queued or running job. A running job's task is cancelled,
+        which closes its in-flight LLM request.
+        """
+        job = await self._update(job_id, only_if={QUEUED, RUNNING}, status=CANCELLED)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        if job is None:
+            job = await asyncio.to_thread(self.get, job_id)
+        return job
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue receiving a job_snapshot dict on every change of the job."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _enqueue(self, job: GenerationJob) -> None:
+        rank = PRIORITY_RANK.get(job.priority, len(PRIORITY_RANK))
+        self._queue.put_nowait((rank, next(self._seq), job.id))
+
+    async def _update(
+        self, job_id: str, only_if: Optional[Set[str]] = None, **fields
+    ) -> Optional[GenerationJob]:
+        """Set fields on a job and notify subscribers; None if not applied."""
+        job = await asyncio.to_thread(self._write, job_id, only_if, fields)
+        if job is not None:
+            for queue in self._subscribers.get(job_id, ()):
+                queue.put_nowait(job_snapshot(job))
+        return job
+
+    def _write(
+        self, job_id: str, only_if: Optional[Set[str]], fields: dict
+    ) -> Optional[GenerationJob]:
+        with Session(engine) as session:
+            job = session.get(GenerationJob, job_id)
+            if job is None or (only_if is not None and job.status not in only_if):
+                return None
+            for name, value in fields.items():
+                setattr(job, name, value)
+            if job.status in FINISHED and job.finished_at is None:
+                job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            task = asyncio.create_task(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                await asyncio.wait([task])
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._update(
+            job_id, only_if={QUEUED}, status=RUNNING, started_at=datetime.utcnow()
+        )
+        if job is None:
+            # cancelled while queued
+            return
+
+        # progress is written by one task at a time, latest value only, so
+        # updates are neither reordered nor queued up behind a slow write
+        latest: Dict[str, Tuple[int, int]] = {}
+        writer: Optional[asyncio.Task[None]] = None
+
+        async def write_progress() -> None:
+            while latest:
+                done, total = latest.pop("progress")
+                await self._update(
+                    job_id, only_if={RUNNING}, progress_done=done, progress_total=total
+                )
+
+        def on_progress(done: int, total: int) -> None:
+            nonlocal writer
+            latest["progress"] = (done, total)
+            if writer is None or writer.done():
+                writer = asyncio.create_task(write_progress())
+
+        async def progress_written() -> None:
+            if writer is not None:
+                await asyncio.gather(writer, return_exceptions=True)
+
+        try:
+            req = json.loads(job.request)
+            texts = await asyncio.to_thread(
+                self._chunk_texts, req.get("source_id"), req.get("chunk_ids")
+            )
+            with interactive_use(hedge=job.priority == "interactive"):
+                async with admission.enqueue(JOBS_CLIENT_ID, wait=True):
+                    cards = await generate_cards_planned(
+                        texts,
+                        req.get("instructions"),
+                        req.get("num_cards", 10),
+                        req.get("temperature", 0.7),
+                        use_cache=req.get("use_cache", True),
+                        on_progress=on_progress,
+                    )
+        except asyncio.CancelledError:
+            if writer is not None:
+                writer.cancel()
+            if self._stopping:
+                await self._update(
+                    job_id,
+                    only_if={RUNNING},
+                    status=QUEUED,
+                    started_at=None,
+                    progress_done=0,
+                )
+            raise
+        except Exception as e:
+            logger.warning("Generation job %s failed: %s", job_id, e)
+            await progress_written()
+            await self._update(job_id, only_if={RUNNING}, status=FAILED, error=str(e))
+            return
+
+        await progress_written()
+        await self._update(
+            job_id,
+            only_if={RUNNING},
+            status=SUCCEEDED,
+            result=json.dumps(cards, ensure_ascii=False),
+        )
+
+    def _chunk_texts(
+        self, source_id: Optional[int], chunk_ids: Optional[List[int]]
+    ) -> List[str]:
+        with Session(engine) as session:
+            return load_chunk_texts(session, source_id, chunk_ids)
+
+
+manager = JobManager()
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from .config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_AGE_DAYS,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MAX_ENTRIES,
+)
+from .db import engine
+from .models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# process-lifetime counters, reported by /api/generate/cache
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+# key -> (hits, last used) not yet written; flushed by put_cached, before
+# eviction needs last_used_at
+_pending_hits: Dict[str, Tuple[int, datetime]] = {}
+_pending_lock = threading.Lock()
+
+
+def cache_key(payload: dict) -> str:
+    """Hash of everything that determines a generation's output."""
+    material = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+    }
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def get_cached(key: str) -> Optional[List[dict]]:
+    """
+    Cached cards for key, or None. Read-only: the hit is recorded in memory
+    and written with the next put_cached. A database error (e.g. locked
+    during a scan) counts as a miss. Blocking; call via asyncio.to_thread.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        with Session(engine) as session:
+            entry = session.get(LLMCacheEntry, key)
+    except SQLAlchemyError as e:
+        logger.warning("LLM cache lookup failed, treating as a miss: %s", e)
+        stats["misses"] += 1
+        return None
+    max_age = timedelta(days=LLM_CACHE_MAX_AGE_DAYS)
+    if entry is None or entry.created_at < datetime.utcnow() - max_age:
+        stats["misses"] += 1
+        return None
+    with _pending_lock:
+        hits, _last_used = _pending_hits.get(key, (0, None))
+        _pending_hits[key] = (hits + 1, datetime.utcnow())
+    stats["hits"] += 1
+    return json.loads(entry.response)
+
+
+def _take_hits() -> Dict[str, Tuple[int, datetime]]:
+    with _pending_lock:
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+    return pending
+
+
+def _restore_hits(pending: Dict[str, Tuple[int, datetime]]) -> None:
+    """Put back hits whose write failed, to be written next time."""
+    with _pending_lock:
+        for key, (hits, last_used) in pending.items():
+            newer_hits, newer_used = _pending_hits.get(key, (0, last_used))
+            _pending_hits[key] = (hits + newer_hits, max(last_used, newer_used))
+
+
+def _write_hits(session: Session, pending: Dict[str, Tuple[int, datetime]]) -> None:
+    """Write hits recorded by get_cached (hit counts, last_used_at)."""
+    for key, (hits, last_used) in pending.items():
+        session.exec(
+            update(LLMCacheEntry)
+            .where(LLMCacheEntry.key == key)
+            .values(hits=LLMCacheEntry.hits + hits, last_used_at=last_used)
+        )
+
+
+def put_cached(key: str, model: str, cards: List[dict]) -> None:
+    """
+    Store cards for key, write pending hits and evict, in one transaction.
+    Best-effort: a database error is logged. Blocking; call via
+    asyncio.to_thread.
+    """
+    if not LLM_CACHE_ENABLED or not cards:
+        return
+    response = json.dumps(cards, ensure_ascii=False)
+    pending = _take_hits()
+    try:
+        with Session(engine) as session:
+            entry = session.get(LLMCacheEntry, key)
+            if entry is None:
+                entry = LLMCacheEntry(
+                    key=key, model=model, response=response, size_bytes=0
+                )
+            entry.response = response
+            entry.size_bytes = len(response.encode("utf-8"))
+            entry.created_at = entry.last_used_at = datetime.utcnow()
+            session.add(entry)
+            _write_hits(session, pending)
+            evict(session)  # commits
+            stats["stores"] += 1
+    except SQLAlchemyError as e:
+        _restore_hits(pending)
+        logger.warning("LLM cache store failed: %s", e)
+
+
+def evict(session: Session) -> int:
+    """
+    Drop entries older than LLM_CACHE_MAX_AGE_DAYS, then least recently used
+    entries until the cache fits LLM_CACHE_MAX_ENTRIES and
+    LLM_CACHE_MAX_BYTES. Returns the number of entries removed.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=LLM_CACHE_MAX_AGE_DAYS)
+    removed = session.exec(
+        delete(LLMCacheEntry).where(LLMCacheEntry.created_at < cutoff)
+    ).rowcount or 0
+
+    count, total_bytes = session.exec(
+        select(func.count(), func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0))
+    ).one()
+    if count > LLM_CACHE_MAX_ENTRIES or total_bytes > LLM_CACHE_MAX_BYTES:
+        victims: List[str] = []
+        rows = session.exec(
+            select(LLMCacheEntry.key, LLMCacheEntry.size_bytes).order_by(
+                LLMCacheEntry.last_used_at
+            )
+        )
+        for key, size_bytes in rows:
+            if count <= LLM_CACHE_MAX_ENTRIES and total_bytes <= LLM_CACHE_MAX_BYTES:
+                break
+            victims.append(key)
+            count -= 1
+            total_bytes -= size_bytes
+        session.exec(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(victims)))
+        removed += len(victims)
+
+    session.commit()
+    if removed:
+        stats["evictions"] += removed
+        logger.info("LLM cache: evicted %s entries", removed)
+    return removed
+
+
+def clear() -> int:
+    with Session(engine) as session:
+        removed = session.exec(delete(LLMCacheEntry)).rowcount or 0
+        session.commit()
+    return removed
+
+
+def summary() -> dict:
+    with Session(engine) as session:
+        count, total_bytes = session.exec(
+            select(func.count(), func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0))
+        ).one()
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "entries": count,
+        "size_bytes": total_bytes,
+        "hit_rate": stats["hits"] / lookups if lookups else None,
+        **stats,
+    }
@@ -1,27 +1,156 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import List
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, List, Set, Tuple
 
 import httpx
 
-from .config import LLM_API_BASE, LLM_API_KEY, LLM_MODEL_NAME
+from . import llm_cache, llm_slots
+from .llm_router import Backend, BackendError, router
+from .config import (
+    LLM_API_KEY,
+    LLM_CARD_RETRIES,
+    LLM_HTTP2,
+    LLM_JSON_SCHEMA,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_MODEL_NAME,
+    LLM_TOKENS_PER_CARD,
+)
+
+logger = logging.getLogger(__name__)
 
 na = "N/A"
 
-async def call_llm_for_cards(
-    text: str, instructions: str | None, num_cards: int, temperature: float
-) -> List[dict]:
+# - longer timeout bc my GPU is a 1060 6GB, so prompt processing can be slow
+LLM_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def open_http_client() -> httpx.AsyncClient:
     """
-    Call the local LLM to generate flashcards from the given text.
+    Create the process-wide client shared by every call to the LLM server
+    (chat, embeddings, tokenize, ...), so connections are pooled and kept
+    alive between requests. Called from the app's startup hook.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            # negotiated via ALPN, so only used with https backends that speak it
+            http2=LLM_HTTP2 and _http2_available(),
+            headers={
+                "Authorization": f"Bearer {LLM_API_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+    return _http_client
 
-    Expects the model to return JSON like:
-      {
-        "cards": [
-          {"front": "...", "back": "..."},
-          ...
-        ]
-      }
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """The shared client, created on first use outside the app (e.g. scripts)."""
+    return _http_client or await open_http_client()
+
+
+# user-driven LLM use in flight, so background work (pregen.py) can yield to it
+_interactive_inflight = 0
+_interactive_last = 0.0
+interactive_started = asyncio.Event()
+# whether LLM requests made in the current context may be hedged
+_hedge: ContextVar[bool] = ContextVar("llm_hedge", default=False)
+
+
+@contextmanager
+def interactive_use(hedge: bool = True) -> Iterator[None]:
+    """
+    Mark a user-driven generation for as long as the block runs. With hedge,
+    its requests may be duplicated on a second backend when slow.
+    """
+    global _interactive_inflight, _interactive_last
+    _interactive_inflight += 1
+    interactive_started.set()
+    previous = _hedge.get()
+    _hedge.set(hedge)
+    try:
+        yield
+    finally:
+        _hedge.set(previous)
+        _interactive_inflight -= 1
+        _interactive_last = time.monotonic()
+
+
+def interactive_idle_seconds() -> float:
+    """Seconds since the last user-driven generation ended; 0 while one runs."""
+    if _interactive_inflight:
+        return 0.0
+    return time.monotonic() - _interactive_last
+
+
+_tokenize_supported = True
+
+
+def estimate_tokens(text: str) -> int:
+    # ~3.5 characters per token for English prose with typical BPE vocabularies
+    return max(1, int(len(text) / 3.5) + 1)
+
+
+async def count_tokens(text: str) -> int:
+    """
+    Exact token count from the server's /tokenize endpoint (llama.cpp), or a
+    character-based estimate if the server does not offer one.
+    """
+    global _tokenize_supported
+    if not _tokenize_supported or not text:
+        return estimate_tokens(text)
+
+    client = await get_http_client()
+    try:
+        resp = await client.post(
+            f"{router.any_root()}/tokenize",
+            json={"content": text},
+            timeout=httpx.Timeout(30.0, connect=10.0),
+        )
+        resp.raise_for_status()
+        return len(resp.json()["tokens"])
+    except (httpx.HTTPError, KeyError, TypeError, ValueError):
+        _tokenize_supported = False
+        logger.info("LLM server has no usable /tokenize, estimating token counts")
+        return estimate_tokens(text)
+
+
+def build_card_messages(
+    text: str, instructions: str | None, num_cards: int
+) -> List[dict]:
+    """
+    Chat messages (system prompt, few-shot example and the actual request)
+    asking the model for num_cards flashcards about text.
     """
     system_prompt = (
         "You are a helpful study tutor that writes high-quality flashcards.\n"
@@ -30,9 +159,8 @@ async def call_llm_for_cards(
         '{ \"cards\": [ { \"front\": \"...\", \"back\": \"...\" }, ... ] }\n'
         "Do not include any explanations or comments.\n"
     )
+    # laid out like user_prompt below, so the example teaches the real format
     example_prompt = (
-        "Generate 2 high-quality flashcards from the following text.\n\n"
-        "Focus on the most important definitions, concepts, equations, and relationships.\n"
         "TEXT:\n"
         """Louis Antony's "No good reason" argument 
         Premises: 1. If an omnipotent (all-powerful) and omnibenevolent (all-good) God exists, He would not allow unnecessary suffering. 
@@ -44,10 +172,11 @@ async def call_llm_for_cards(
         - Some argue that suffering results from human free will and that God values free will so much that He allows the consequences of bad choices. However, this does not explain natural disasters or diseases. Soul-Making Theodicy (John Hick) 
         - Some argue that suffering builds character and is necessary for moral and spiritual growth. 
         Antony's counter would be: Does suffering really need to be this extreme? Wouldn't an all-loving God design a world where growth happens without unbearable suffering? Skeptical Theism 
-        - Some theists argue that just because we don't see a good reason for suffering does not mean there isn't one. God's ways may be beyond human understanding. However, this can be criticized as an argument from ignorance (assuming God's reason exists simply because we don't know it).\n
-        ADDITIONAL INSTRUCTIONS FROM USER:\n
-        one should be about the main claim
-    """)
+        - Some theists argue that just because we don't see a good reason for suffering does not mean there isn't one. God's ways may be beyond human understanding. However, this can be criticized as an argument from ignorance (assuming God's reason exists simply because we don't know it).\n"""
+        "Generate 2 high-quality flashcards from the text above.\n"
+        "Focus on the most important definitions, concepts, equations, and relationships.\n"
+        "ADDITIONAL INSTRUCTIONS FROM USER:\n one should be about the main claim"
+    )
     example_response = (
         """{
             "cards": [
@@ -62,77 +191,604 @@ async def call_llm_for_cards(
             ]
             }"""
     )
+    # the source text goes right after the fixed prefix (system prompt and
+    # example), so the server's prompt cache can reuse it across requests
+    # that only differ in card count or instructions
     user_prompt = (
-        f"Generate {num_cards} high-quality flashcards from the following text.\n"
-        "Focus on the most important definitions, concepts, equations, and relationships.\n"
         "TEXT:\n"
         f"{text}\n"
+        f"Generate {num_cards} high-quality flashcards from the text above.\n"
+        "Focus on the most important definitions, concepts, equations, and relationships.\n"
         f"ADDITIONAL INSTRUCTIONS FROM USER:\n {instructions if instructions is not None else na}"
     )
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": example_prompt},
+        {"role": "assistant", "content": example_response},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+@asynccontextmanager
+async def _prompt_slot(
+    client: httpx.AsyncClient, backend: Backend, text: str
+) -> AsyncIterator[Tuple[dict, bool]]:
+    """
+    Extra completion fields pinning the request to one of backend's llama.cpp
+    slots with prompt caching (empty when disabled), and whether that slot is
+    warm.
+    """
+    if not llm_slots.enabled:
+        yield {}, False
+        return
+    async with backend.slots.acquire(
+        llm_slots.slot_key(text), client, backend.root
+    ) as (slot_id, warm):
+        yield {"cache_prompt": True, "id_slot": slot_id}, warm
+
+
+def _clean_card(item: object) -> dict | None:
+    if not isinstance(item, dict):
+        return None
+    front = item.get("front")
+    back = item.get("back")
+    if isinstance(front, str) and isinstance(back, str):
+        front_clean = front.strip()
+        back_clean = back.strip()
+        if front_clean and back_clean:
+            return {"front": front_clean, "back": back_clean}
+    return None
+
+
+class IncrementalCardParser:
+    """
+    Pull complete card objects out of a JSON document as it streams in.
+
+    Any object that sits directly inside an array (the "cards" list, or a
+    bare top-level list) is parsed as soon as its closing brace arrives, so
+    cards can be emitted long before the document is complete. Text outside
+    the JSON (e.g. markdown code fences) is ignored.
+
+    parsed_upto is the offset (in everything fed so far) just past the last
+    complete card, and closed turns True once the outermost JSON value has
+    been closed.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0
+        self._offset = 0
+        self.parsed_upto = 0
+        self.closed = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._obj_start: int | None = None
+        self._obj_depth = 0
+
+    def feed(self, text: str) -> List[dict]:
+        self._buf += text
+        cards: List[dict] = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._obj_start is None and self._stack and self._stack[-1] == "[":
+                    self._obj_start = i
+                    self._obj_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                    if not self._stack:
+                        self.closed = True
+                if ch == "}" and self._obj_start is not None and len(self._stack) == self._obj_depth:
+                    try:
+                        card = _clean_card(json.loads(buf[self._obj_start : i + 1]))
+                    except json.JSONDecodeError:
+                        card = None
+                    if card is not None:
+                        cards.append(card)
+                        self.parsed_upto = self._offset + i + 1
+                    self._obj_start = None
+
+        self._pos = len(buf)
+        if self._obj_start is None:
+            # nothing pending: drop what has been consumed
+            self._offset += len(buf)
+            self._buf = ""
+            self._pos = 0
+        return cards
+
+
+def parse_cards(content: str) -> Tuple[List[dict], int, bool]:
+    """
+    Cards in a model response. A well-formed {"cards": [...]} document is
+    parsed as such; anything else (output cut off at max_tokens, a missing
+    bracket, trailing junk) is salvaged by picking out every complete card
+    object. Returns the cards, the offset just past the last complete card
+    and whether the response held a complete JSON document.
+    """
+    try:
+        obj = json.loads(content)
+    except json.JSONDecodeError:
+        obj = None
+    if isinstance(obj, dict) and isinstance(obj.get("cards"), list):
+        cards = [c for c in (_clean_card(item) for item in obj["cards"]) if c]
+        return cards, len(content), True
+
+    parser = IncrementalCardParser()
+    cards = parser.feed(content)
+    return cards, parser.parsed_upto, parser.closed
+
+
+def cards_response_format(num_cards: int) -> dict:
+    """
+    OpenAI-style json_schema response_format for the cards document, which
+    llama.cpp (and other servers with grammar support) enforce while
+    sampling, so the output is always a complete, valid card list.
+    """
+    card = {
+        "type": "object",
+        "properties": {
+            "front": {"type": "string", "minLength": 1},
+            "back": {"type": "string", "minLength": 1},
+        },
+        "required": ["front", "back"],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "flashcards",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "cards": {
+                        "type": "array",
+                        "items": card,
+                        "minItems": 1,
+                        "maxItems": max(1, num_cards),
+                    }
+                },
+                "required": ["cards"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+# cleared the first time the server rejects a response_format
+_json_schema_supported = LLM_JSON_SCHEMA
+# words in a 400 body that mean the server rejected response_format itself,
+# rather than e.g. a prompt that does not fit the context
+_SCHEMA_ERROR_WORDS = ("response_format", "json_schema", "grammar")
+
+
+def _card_payload(
+    text: str,
+    instructions: str | None,
+    num_cards: int,
+    temperature: float,
+    max_tokens: int,
+    stream: bool,
+) -> dict:
     payload = {
         "model": LLM_MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": example_prompt},
-            {"role": "assistant", "content": example_response},
-            {"role": "user", "content": user_prompt},
-        ],
+        "messages": build_card_messages(text, instructions, num_cards),
         "temperature": float(temperature),
-        "max_tokens": 5000,
-        "stream": False,
+        "max_tokens": max_tokens,
+        "stream": stream,
     }
+    if _json_schema_supported:
+        payload["response_format"] = cards_response_format(num_cards)
+    return payload
+
+
+def _schema_rejected(resp: httpx.Response, payload: dict) -> bool:
+    """Whether resp is a 400 caused by the payload's response_format."""
+    if resp.status_code != 400 or "response_format" not in payload:
+        return False
+    body = resp.text.lower()
+    return any(word in body for word in _SCHEMA_ERROR_WORDS)
+
+
+def _without_schema(payload: dict) -> dict:
+    global _json_schema_supported
+    if _json_schema_supported:
+        _json_schema_supported = False
+        logger.info("LLM server rejected response_format, sending plain requests")
+    return {k: v for k, v in payload.items() if k != "response_format"}
+
+
+def _retry_request(
+    instructions: str | None, cards: List[dict], missing: int, max_tokens: int
+) -> Tuple[str | None, int]:
+    """
+    (instructions, max_tokens) for a follow-up request for `missing` more
+    cards that must not repeat cards. The first request was sized to fill
+    the context (see generation_planner), so the list of written cards is
+    paid for out of max_tokens, keeping LLM_TOKENS_PER_CARD per missing
+    card, and trimmed to the most recent cards that fit.
+    """
+    header = "These cards already exist, do not repeat them:"
+    budget = max_tokens - LLM_TOKENS_PER_CARD * missing
+    used = estimate_tokens(header)
+    lines: List[str] = []
+    for card in reversed(cards):
+        line = f"- {card['front']}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return instructions, max_tokens
+
+    note = "\n".join([header, *reversed(lines)])
+    return (f"{instructions}\n{note}" if instructions else note), max_tokens - used
+
 
-    headers = {
-        "Authorization": f"Bearer {LLM_API_KEY}",
-        "Content-Type": "application/json",
+def _card_key(card: dict) -> str:
+    return " ".join(card["front"].lower().split())
+
+
+# process-lifetime accounting of generation requests, reported by
+# /api/generate/efficiency; "wasted" is GPU time / completion tokens that
+# did not end up in a returned card (failed requests, cut-off tails)
+generation_stats = {
+    "requests": 0,
+    "salvaged": 0,
+    "retries": 0,
+    "failed": 0,
+    "cards": 0,
+    "gpu_ms": 0.0,
+    "wasted_ms": 0.0,
+    "completion_tokens": 0,
+    "wasted_tokens": 0,
+}
+
+
+def _account(
+    timings: dict | None,
+    usage: dict | None,
+    content_len: int,
+    parsed_upto: int,
+    cards: int,
+    complete: bool,
+    wall_ms: float,
+) -> None:
+    timings = timings or {}
+    usage = usage or {}
+    prompt_ms = float(timings.get("prompt_ms") or 0.0)
+    predicted_ms = float(timings.get("predicted_ms") or 0.0)
+    gpu_ms = prompt_ms + predicted_ms if timings else wall_ms
+    tokens = int(
+        usage.get("completion_tokens")
+        or timings.get("predicted_n")
+        or content_len / 3.5
+    )
+
+    if cards == 0:
+        wasted = 1.0
+        wasted_ms = gpu_ms
+    else:
+        # the part of the output after the last complete card
+        tail = content_len - parsed_upto
+        wasted = 0.0 if complete else tail / max(1, content_len)
+        wasted_ms = (predicted_ms if timings else wall_ms) * wasted
+
+    generation_stats["requests"] += 1
+    generation_stats["cards"] += cards
+    generation_stats["gpu_ms"] += gpu_ms
+    generation_stats["wasted_ms"] += wasted_ms
+    generation_stats["completion_tokens"] += tokens
+    generation_stats["wasted_tokens"] += int(tokens * wasted)
+    if cards == 0:
+        generation_stats["failed"] += 1
+    elif not complete:
+        generation_stats["salvaged"] += 1
+
+
+def generation_summary() -> dict:
+    cards = generation_stats["cards"]
+    return {
+        "json_schema": _json_schema_supported,
+        **generation_stats,
+        "wasted_ms_per_card": (
+            round(generation_stats["wasted_ms"] / cards, 1) if cards else None
+        ),
+        "wasted_tokens_per_card": (
+            round(generation_stats["wasted_tokens"] / cards, 1) if cards else None
+        ),
     }
-    # - longer timeout bc my GPU is a 1060 6GB, so prompt processing can be slow
-    timeout = httpx.Timeout(300.0, connect=10.0)
 
-    try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
+
+async def _request_cards(
+    client: httpx.AsyncClient, backend: Backend, payload: dict, text: str
+) -> Tuple[List[dict], bool]:
+    """One non-streamed completion: (cards, response was complete)."""
+    start = time.monotonic()
+    async with _prompt_slot(client, backend, text) as (slot_fields, warm):
+        try:
             resp = await client.post(
-                f"{LLM_API_BASE}/chat/completions",
-                headers=headers,
-                json=payload,
+                f"{backend.url}/chat/completions", json={**payload, **slot_fields}
             )
-    except httpx.RequestError as e:
-        raise RuntimeError(f"LLM request failed: {e}") from e
+        except httpx.RequestError as e:
+            raise BackendError(f"LLM request failed: {e}") from e
 
+    if _schema_rejected(resp, payload):
+        return await _request_cards(client, backend, _without_schema(payload), text)
+    if resp.status_code >= 500:
+        raise BackendError(f"LLM server error {resp.status_code}: {resp.text[:200]}")
     resp.raise_for_status()
     data = resp.json()
+    llm_slots.record_timings(data, warm)
 
     try:
-        content = data["choices"][0]["message"]["content"]
-    except (KeyError, IndexError) as e:
+        choice = data["choices"][0]
+        content = choice["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError) as e:
         raise RuntimeError(f"Unexpected LLM response structure: {e}") from e
 
-    try:
-        obj = json.loads(content)
-    except json.JSONDecodeError as e:
-        raise RuntimeError(f"LLM did not return valid JSON: {e}") from e
+    cards, parsed_upto, well_formed = parse_cards(content)
+    complete = well_formed and choice.get("finish_reason") != "length"
+    _account(
+        data.get("timings"),
+        data.get("usage"),
+        len(content),
+        parsed_upto,
+        len(cards),
+        complete,
+        (time.monotonic() - start) * 1000,
+    )
+    if not cards and not well_formed:
+        logger.warning("LLM did not return valid JSON: %.200s", content)
+    return cards, complete
 
-    if not isinstance(obj, dict) or "cards" not in obj:
-        raise RuntimeError("LLM JSON output missing 'cards' field")
 
-    cards_field = obj["cards"]
-    if not isinstance(cards_field, list):
-        raise RuntimeError("'cards' must be a list")
+async def call_llm_for_cards(
+    text: str,
+    instructions: str | None,
+    num_cards: int,
+    temperature: float,
+    use_cache: bool = True,
+    max_tokens: int = 5000,
+) -> List[dict]:
+    """
+    Call the local LLM to generate flashcards from the given text.
+
+    Expects the model to return JSON like:
+      {
+        "cards": [
+          {"front": "...", "back": "..."},
+          ...
+        ]
+      }
+    The structure is enforced with response_format where the server
+    supports it. Complete cards are salvaged from malformed or cut-off
+    output, and up to LLM_CARD_RETRIES follow-up requests ask only for the
+    cards still missing.
+    """
+    payload = _card_payload(
+        text, instructions, num_cards, temperature, max_tokens, stream=False
+    )
+
+    key = llm_cache.cache_key(payload)
+    if use_cache:
+        cached = await asyncio.to_thread(llm_cache.get_cached, key)
+        if cached is not None:
+            return cached
 
+    client = await get_http_client()
     results: List[dict] = []
-    for item in cards_field:
-        if not isinstance(item, dict):
-            continue
-        front = item.get("front")
-        back = item.get("back")
-        if isinstance(front, str) and isinstance(back, str):
-            front_clean = front.strip()
-            back_clean = back.strip()
-            if front_clean and back_clean:
-                results.append({"front": front_clean, "back": back_clean})
+    seen: Set[str] = set()
+    for attempt in range(LLM_CARD_RETRIES + 1):
+        if attempt:
+            generation_stats["retries"] += 1
+            missing = num_cards - len(results)
+            retry_instructions, retry_max_tokens = _retry_request(
+                instructions, results, missing, max_tokens
+            )
+            payload = _card_payload(
+                text,
+                retry_instructions,
+                missing,
+                temperature,
+                retry_max_tokens,
+                stream=False,
+            )
+        cards, complete = await router.run(
+            lambda backend: _request_cards(client, backend, payload, text),
+            hedge=_hedge.get(),
+        )
+        for card in cards:
+            if _card_key(card) not in seen:
+                seen.add(_card_key(card))
+                results.append(card)
+        if complete or len(results) >= num_cards:
+            break
 
     if not results:
         raise RuntimeError("LLM returned no valid cards")
 
+    await asyncio.to_thread(llm_cache.put_cached, key, LLM_MODEL_NAME, results)
     return results
+
+
+async def _stream_request(
+    client: httpx.AsyncClient,
+    backend: Backend,
+    payload: dict,
+    text: str,
+    state: dict,
+) -> AsyncIterator[dict]:
+    """
+    One streamed completion, yielding cards as they complete. Sets
+    state["complete"] to whether the response was complete.
+    """
+    start = time.monotonic()
+    parser = IncrementalCardParser()
+    content_len = 0
+    count = 0
+    truncated = False
+    rejected = False
+    final: dict = {}
+    try:
+        # the read timeout applies between streamed chunks, so it mostly
+        # covers prompt processing before the first token
+        async with _prompt_slot(client, backend, text) as (
+            slot_fields,
+            warm,
+        ), client.stream(
+            "POST",
+            f"{backend.url}/chat/completions",
+            json={**payload, **slot_fields},
+        ) as resp:
+            if resp.is_error:
+                await resp.aread()
+                if resp.status_code >= 500:
+                    raise BackendError(
+                        f"LLM server error {resp.status_code}: {resp.text[:200]}"
+                    )
+                rejected = _schema_rejected(resp, payload)
+                if not rejected:
+                    resp.raise_for_status()
+            else:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        # llama.cpp sends its timings (and usage) with the
+                        # final chunk
+                        if "timings" in chunk:
+                            llm_slots.record_timings(chunk, warm)
+                            final = chunk
+                        choices = chunk["choices"]
+                        choice = choices[0] if choices else {}
+                        delta = choice.get("delta") or {}
+                    except (json.JSONDecodeError, KeyError, IndexError) as e:
+                        raise RuntimeError(f"Unexpected LLM stream chunk: {e}") from e
+                    if choice.get("finish_reason") == "length":
+                        truncated = True
+                    piece = delta.get("content") or ""
+                    content_len += len(piece)
+                    for card in parser.feed(piece):
+                        count += 1
+                        yield card
+    except httpx.RequestError as e:
+        raise BackendError(f"LLM request failed: {e}") from e
+
+    if rejected:
+        async for card in _stream_request(
+            client, backend, _without_schema(payload), text, state
+        ):
+            yield card
+        return
+
+    state["complete"] = parser.closed and not truncated
+    _account(
+        final.get("timings"),
+        final.get("usage"),
+        content_len,
+        parser.parsed_upto,
+        count,
+        state["complete"],
+        (time.monotonic() - start) * 1000,
+    )
+
+
+async def _stream_routed(
+    client: httpx.AsyncClient, payload: dict, text: str, state: dict
+) -> AsyncIterator[dict]:
+    """_stream_request on the best backend, failing over until a card is out."""
+    tried: List[Backend] = []
+    while True:
+        backend = router.pick(exclude=tried)
+        if backend is None:
+            raise BackendError("No LLM backend available")
+        tried.append(backend)
+        count = 0
+        try:
+            async with router.lease(backend):
+                async for card in _stream_request(client, backend, payload, text, state):
+                    count += 1
+                    yield card
+            return
+        except BackendError as e:
+            if count or len(tried) == len(router.backends):
+                raise
+            logger.warning("LLM backend %s failed: %s", backend.url, e)
+
+
+async def stream_llm_cards(
+    text: str,
+    instructions: str | None,
+    num_cards: int,
+    temperature: float,
+    use_cache: bool = True,
+    max_tokens: int = 5000,
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of call_llm_for_cards: requests a streamed completion
+    and yields each card as soon as its JSON object is complete.
+    """
+    payload = _card_payload(
+        text, instructions, num_cards, temperature, max_tokens, stream=True
+    )
+
+    key = llm_cache.cache_key(payload)
+    if use_cache:
+        cached = await asyncio.to_thread(llm_cache.get_cached, key)
+        if cached is not None:
+            for card in cached:
+                yield card
+            return
+
+    emitted: List[dict] = []
+    seen: Set[str] = set()
+    client = await get_http_client()
+    for attempt in range(LLM_CARD_RETRIES + 1):
+        if attempt:
+            generation_stats["retries"] += 1
+            missing = num_cards - len(emitted)
+            retry_instructions, retry_max_tokens = _retry_request(
+                instructions, emitted, missing, max_tokens
+            )
+            payload = _card_payload(
+                text,
+                retry_instructions,
+                missing,
+                temperature,
+                retry_max_tokens,
+                stream=True,
+            )
+        state = {"complete": False}
+        async for card in _stream_routed(client, payload, text, state):
+            if _card_key(card) not in seen:
+                seen.add(_card_key(card))
+                emitted.append(card)
+                yield card
+        if state["complete"] or len(emitted) >= num_cards:
+            break
+
+    if not emitted:
+        raise RuntimeError("LLM returned no valid cards")
+    await asyncio.to_thread(llm_cache.put_cached, key, LLM_MODEL_NAME, emitted)
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    List,
+    Optional,
+    TypeVar,
+)
+
+import httpx
+
+from .config import (
+    LLM_API_BASE,
+    LLM_BACKENDS,
+    LLM_HEALTH_INTERVAL_SECONDS,
+    LLM_HEDGE_AFTER_SECONDS,
+    LLM_SLOTS,
+)
+from .llm_slots import SlotPool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class BackendError(RuntimeError):
+    """A request failed because of its backend, so another may succeed."""
+
+
+@dataclass
+class Backend:
+    url: str
+    max_concurrency: int = 1
+    weight: float = 1.0
+    healthy: bool = True
+    active: int = 0
+    waiting: int = 0
+    requests: int = 0
+    failures: int = 0
+    hedges: int = 0
+    latency_ms: Optional[float] = None
+    slots: SlotPool = field(init=False)
+    _sem: Optional[asyncio.Semaphore] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.url = self.url.rstrip("/")
+        self.max_concurrency = max(1, self.max_concurrency)
+        self.slots = SlotPool(slots=self.max_concurrency)
+
+    @property
+    def root(self) -> str:
+        """llama.cpp's own endpoints (/tokenize, /slots, ...) live outside /v1."""
+        return self.url[: -len("/v1")] if self.url.endswith("/v1") else self.url
+
+    @property
+    def load(self) -> float:
+        return (self.active + self.waiting) / (self.max_concurrency * self.weight)
+
+    def summary(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "max_concurrency": self.max_concurrency,
+            "weight": self.weight,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "requests": self.requests,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms else None,
+        }
+
+
+def parse_backends(spec: str) -> List[Backend]:
+    """
+    Backends from "<api base> [concurrency=N] [weight=W], ..."; an empty spec
+    means LLM_API_BASE with LLM_SLOTS concurrency.
+    """
+    backends: List[Backend] = []
+    for entry in spec.split(","):
+        parts = entry.split()
+        if not parts:
+            continue
+        options = dict(p.split("=", 1) for p in parts[1:] if "=" in p)
+        backends.append(
+            Backend(
+                parts[0],
+                max_concurrency=int(options.get("concurrency", LLM_SLOTS)),
+                weight=float(options.get("weight", 1.0)),
+            )
+        )
+    return backends or [Backend(LLM_API_BASE, max_concurrency=LLM_SLOTS)]
+
+
+class LLMRouter:
+    """
+    Spreads LLM requests over backends: each request goes to the healthy
+    backend with the lowest (in flight + queued) / (concurrency * weight),
+    waits there for a free concurrency slot, and is retried on another
+    backend if it fails with a BackendError. Backends are health-checked in
+    the background and taken out of rotation while they fail.
+    """
+
+    def __init__(self, backends: List[Backend]):
+        self.backends = backends
+        self._health_task: Optional[asyncio.Task[None]] = None
+
+    def pick(self, exclude: Collection[Backend] = ()) -> Optional[Backend]:
+        candidates = [b for b in self.backends if b not in exclude]
+        healthy = [b for b in candidates if b.healthy]
+        # with nothing healthy, still try: health checks may be stale
+        pool = healthy or candidates
+        if not pool:
+            return None
+        return min(pool, key=lambda b: (b.load, b.latency_ms or 0.0))
+
+    @asynccontextmanager
+    async def lease(self, backend: Backend) -> AsyncIterator[Backend]:
+        """Hold one of backend's concurrency slots, timing the request."""
+        if backend._sem is None:
+            backend._sem = asyncio.Semaphore(backend.max_concurrency)
+        backend.waiting += 1
+        try:
+            await backend._sem.acquire()
+        finally:
+            backend.waiting -= 1
+        backend.active += 1
+        backend.requests += 1
+        start = time.monotonic()
+        try:
+            yield backend
+        except BackendError:
+            backend.failures += 1
+            backend.healthy = False
+            raise
+        else:
+            elapsed = (time.monotonic() - start) * 1000
+            if backend.latency_ms is None:
+                backend.latency_ms = elapsed
+            else:
+                backend.latency_ms += LATENCY_EWMA_ALPHA * (elapsed - backend.latency_ms)
+        finally:
+            backend.active -= 1
+            backend._sem.release()
+
+    async def run(
+        self,
+        request: Callable[[Backend], Awaitable[T]],
+        hedge: bool = False,
+    ) -> T:
+        """
+        Run request on the best backend, failing over to the others. With
+        hedge (and LLM_HEDGE_AFTER_SECONDS set), a copy is started on an idle
+        backend if the first has not answered in time; the first to succeed
+        wins and the other is cancelled.
+        """
+        tried: List[Backend] = []
+        last_error: Optional[BackendError] = None
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                raise last_error or BackendError("No LLM backend available")
+            tried.append(backend)
+            try:
+                if hedge and LLM_HEDGE_AFTER_SECONDS > 0 and len(self.backends) > 1:
+                    return await self._hedged(request, backend, tried)
+                async with self.lease(backend):
+                    return await request(backend)
+            except BackendError as e:
+                logger.warning("LLM backend %s failed: %s", backend.url, e)
+                last_error = e
+
+    async def _hedged(
+        self,
+        request: Callable[[Backend], Awaitable[T]],
+        primary: Backend,
+        tried: List[Backend],
+    ) -> T:
+        async def attempt(backend: Backend) -> T:
+            async with self.lease(backend):
+                return await request(backend)
+
+        tasks = [asyncio.create_task(attempt(primary))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=LLM_HEDGE_AFTER_SECONDS)
+            if not done:
+                second = self.pick(exclude=tried)
+                if second is not None and second.healthy and second.load < 1:
+                    tried.append(second)
+                    second.hedges += 1
+                    tasks.append(asyncio.create_task(attempt(second)))
+            errors = []
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            # the loser's request is aborted, freeing its backend slot
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def any_root(self) -> str:
+        backend = self.pick() or self.backends[0]
+        return backend.root
+
+    async def check_health(self, client: httpx.AsyncClient) -> None:
+        async def check(backend: Backend) -> None:
+            try:
+                resp = await client.get(
+                    f"{backend.root}/health", timeout=httpx.Timeout(5.0)
+                )
+                if resp.status_code == 404:
+                    # not llama.cpp: any OpenAI-compatible server lists models
+                    resp = await client.get(
+                        f"{backend.url}/models", timeout=httpx.Timeout(5.0)
+                    )
+                healthy = resp.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != backend.healthy:
+                logger.info(
+                    "LLM backend %s is %s",
+                    backend.url,
+                    "healthy" if healthy else "unhealthy",
+                )
+            backend.healthy = healthy
+
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    async def _health_loop(
+        self, get_client: Callable[[], Awaitable[httpx.AsyncClient]]
+    ) -> None:
+        while True:
+            try:
+                await self.check_health(await get_client())
+            except Exception:
+                logger.exception("LLM health check failed")
+            await asyncio.sleep(LLM_HEALTH_INTERVAL_SECONDS)
+
+    def start(self, get_client: Callable[[], Awaitable[httpx.AsyncClient]]) -> None:
+        for backend in self.backends:
+            # asyncio primitives belong to the loop that first used them
+            backend._sem = None
+            backend.slots = SlotPool(slots=backend.max_concurrency)
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(get_client))
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def summary(self) -> List[dict]:
+        return [b.summary() for b in self.backends]
+
+
+router = LLMRouter(parse_backends(LLM_BACKENDS))
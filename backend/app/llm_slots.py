@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from .config import (
+    LLM_PROMPT_CACHE,
+    LLM_SLOT_SAVE,
+    LLM_SLOT_SAVE_MAX_FILES,
+)
+
+logger = logging.getLogger(__name__)
+
+SLOT_FILE_PREFIX = "studywire-slot"
+
+
+def slot_key(text: str) -> str:
+    """Affinity key for a generation: the source text it is about."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Slot:
+    id: int
+    key: Optional[str] = None
+    busy: bool = False
+    last_used: float = 0.0
+
+
+class SlotPool:
+    """
+    Hands out llama.cpp server slots so a generation lands on the slot whose
+    KV cache already holds its prompt. The fixed system/few-shot prefix is
+    shared by every request; with cache_prompt the server then only
+    evaluates what follows the longest cached prefix.
+
+    With save_enabled, the KV state of a slot is saved to the server's
+    --slot-save-path before the slot is given to another source, and
+    restored when that source comes back. Saved states are written to a
+    ring of max_files file names, so the server's disk use stays bounded.
+    """
+
+    def __init__(
+        self,
+        slots: int = 1,
+        save_enabled: bool = LLM_SLOT_SAVE,
+        max_files: int = LLM_SLOT_SAVE_MAX_FILES,
+    ):
+        self._slots = [_Slot(i) for i in range(max(1, slots))]
+        self._cond: Optional[asyncio.Condition] = None
+        self.save_enabled = save_enabled
+        self.max_files = max(1, max_files)
+        # source key -> saved file name, least recently used first
+        self._saved: "OrderedDict[str, str]" = OrderedDict()
+
+    @asynccontextmanager
+    async def acquire(
+        self, key: str, client: httpx.AsyncClient, server_root: str
+    ) -> AsyncIterator[tuple]:
+        """
+        Reserve a slot for a generation about key. Yields (slot id, warm),
+        warm meaning the slot already holds (or was restored to) this key.
+        """
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: any(not s.busy for s in self._slots))
+            free = [s for s in self._slots if not s.busy]
+            slot = next((s for s in free if s.key == key), None)
+            if slot is None:
+                slot = min(free, key=lambda s: s.last_used)
+            slot.busy = True
+
+        try:
+            warm = slot.key == key
+            if warm:
+                stats["affinity_hits"] += 1
+            else:
+                warm = await self._switch(slot, key, client, server_root)
+            yield slot.id, warm
+        finally:
+            slot.last_used = time.monotonic()
+            async with self._cond:
+                slot.busy = False
+                self._cond.notify()
+
+    async def _switch(
+        self, slot: _Slot, key: str, client: httpx.AsyncClient, server_root: str
+    ) -> bool:
+        """Move slot over to key, saving its current source first."""
+        previous, slot.key = slot.key, key
+        if not self.save_enabled:
+            return False
+        if previous is not None and previous not in self._saved:
+            filename = self._file_for(previous)
+            await self._slot_action(slot.id, "save", filename, client, server_root)
+        filename = self._saved.get(key)
+        if filename is None or not self.save_enabled:
+            return False
+        self._saved.move_to_end(key)
+        data = await self._slot_action(
+            slot.id, "restore", filename, client, server_root
+        )
+        return bool(data and data.get("n_restored"))
+
+    def _file_for(self, key: str) -> str:
+        if len(self._saved) >= self.max_files:
+            # reuse the least recently used source's file
+            _, filename = self._saved.popitem(last=False)
+        else:
+            filename = f"{SLOT_FILE_PREFIX}-{len(self._saved)}.bin"
+        self._saved[key] = filename
+        return filename
+
+    async def _slot_action(
+        self,
+        slot_id: int,
+        action: str,
+        filename: str,
+        client: httpx.AsyncClient,
+        server_root: str,
+    ) -> Optional[dict]:
+        try:
+            resp = await client.post(
+                f"{server_root}/slots/{slot_id}",
+                params={"action": action},
+                json={"filename": filename},
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # typically a server started without --slot-save-path
+            logger.warning(
+                "LLM slot %s failed, disabling slot saving: %s", action, e
+            )
+            self.save_enabled = False
+            self._saved.clear()
+            return None
+        stats[f"{action}s"] += 1
+        timings = data.get("timings") or {}
+        stats[f"{action}_ms"] += float(timings.get(f"{action}_ms") or 0.0)
+        return data
+
+
+# send cache_prompt/id_slot with completions (scripts may toggle this)
+enabled = LLM_PROMPT_CACHE
+
+# process-lifetime counters, reported by /api/generate/prompt_cache
+stats: Dict[str, float] = {
+    "affinity_hits": 0,
+    "saves": 0,
+    "save_ms": 0.0,
+    "restores": 0,
+    "restore_ms": 0.0,
+}
+# prompt evaluation of finished requests, cold (new slot content) vs warm
+# [requests, prompt_ms, prompt tokens evaluated, prompt tokens reused]
+_prompt_timings: Dict[str, List[float]] = {
+    "cold": [0, 0.0, 0, 0],
+    "warm": [0, 0.0, 0, 0],
+}
+
+
+def reset_timings() -> None:
+    for entry in _prompt_timings.values():
+        entry[:] = [0, 0.0, 0, 0]
+
+
+def record_timings(data: dict, warm: bool) -> None:
+    """Account llama.cpp's "timings" block of a completion response."""
+    timings = data.get("timings")
+    if not isinstance(timings, dict):
+        return
+    entry = _prompt_timings["warm" if warm else "cold"]
+    entry[0] += 1
+    entry[1] += float(timings.get("prompt_ms") or 0.0)
+    entry[2] += int(timings.get("prompt_n") or 0)
+    entry[3] += int(timings.get("cache_n") or 0)
+
+
+def summary(pools: List[SlotPool]) -> dict:
+    """
+    Average prompt evaluation per request: prompt_tokens are the tokens the
+    server actually evaluated, cached_tokens those it reused from the slot.
+    """
+    result: dict = {
+        "enabled": enabled,
+        "slots": sum(len(p._slots) for p in pools),
+        "slot_save": any(p.save_enabled for p in pools),
+        "saved_sources": sum(len(p._saved) for p in pools),
+        **stats,
+    }
+    for name, (n, prompt_ms, prompt_n, cache_n) in _prompt_timings.items():
+        result[name] = {
+            "requests": n,
+            "avg_prompt_ms": round(prompt_ms / n, 1) if n else None,
+            "avg_prompt_tokens": round(prompt_n / n, 1) if n else None,
+            "avg_cached_tokens": round(cache_n / n, 1) if n else None,
+        }
+    return result
@@ -1,23 +1,37 @@
 import asyncio
 import logging
-from typing import Optional
+from typing import List
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import Session
+from . import embedding_index
+from .jobs import manager as job_manager
+from .pregen import pregenerator
 from .api.deps import ensure_default_deck
 from .api.routes import (
     cards,
     decks,
+    drafts,
     generate,
     health,
+    jobs,
     review,
     search,
     sources,
     practice,
 )
-from .config import NOTES_ROOT
-from .content_manager import scan_notes_root
+from .config import (
+    NOTES_FULL_SCAN_INTERVAL_SECONDS,
+    NOTES_POLL_INTERVAL_SECONDS,
+    NOTES_ROOT,
+    NOTES_WATCH_DEBOUNCE_SECONDS,
+    NOTES_WATCH_MODE,
+)
 from .db import engine, init_db
+from .llm_client import close_http_client, get_http_client, open_http_client
+from .llm_router import router as llm_router
+from .notes_scanner import scanner
+from .notes_watcher import NotesWatcher
 
 
 app = FastAPI(title="Study Tool Backend")
@@ -33,44 +47,56 @@ app.add_middleware(
 
 logger = logging.getLogger(__name__)
 
-SCAN_INTERVAL_SECONDS = 300
-notes_scan_task: Optional[asyncio.Task[None]] = None
-
-
-async def scan_notes_once() -> None:
-    with Session(engine) as session:
-        processed = scan_notes_root(session, NOTES_ROOT)
-    logger.info("Notes scan complete: %s sources processed", processed)
+background_tasks: List[asyncio.Task[None]] = []
 
 
 async def schedule_note_scans() -> None:
+    # the first scan runs right away, in the background: the server is
+    # already serving while it reads the notes tree
     while True:
-        await asyncio.sleep(SCAN_INTERVAL_SECONDS)
         try:
-            await scan_notes_once()
+            await scanner.scan()
         except Exception:
             logger.exception("Failed to scan notes root")
+        await asyncio.sleep(NOTES_FULL_SCAN_INTERVAL_SECONDS)
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
+    await open_http_client()
+    llm_router.start(get_http_client)
     init_db()
     with Session(engine) as session:
         ensure_default_deck(session)
-    await scan_notes_once()
-
-    global notes_scan_task
-    notes_scan_task = asyncio.create_task(schedule_note_scans())
+    await job_manager.start()
+    await pregenerator.start()
+
+    background_tasks.append(asyncio.create_task(schedule_note_scans()))
+    if NOTES_WATCH_MODE != "off":
+        watcher = NotesWatcher(
+            NOTES_ROOT,
+            scanner.ingest,
+            mode=NOTES_WATCH_MODE,
+            debounce_seconds=NOTES_WATCH_DEBOUNCE_SECONDS,
+            poll_interval_seconds=NOTES_POLL_INTERVAL_SECONDS,
+        )
+        background_tasks.append(asyncio.create_task(watcher.run()))
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
-    global notes_scan_task
-    if notes_scan_task is not None:
-        notes_scan_task.cancel()
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
         try:
-            await notes_scan_task
+            await task
         except asyncio.CancelledError:
             pass
+    background_tasks.clear()
+    await job_manager.stop()
+    await pregenerator.stop()
+    await embedding_index.stop_sync()
+    await llm_router.stop()
+    await close_http_client()
 
 
 app.include_router(health.router)
@@ -80,4 +106,6 @@ app.include_router(decks.router)
 app.include_router(cards.router)
 app.include_router(review.router)
 app.include_router(generate.router)
+app.include_router(jobs.router)
+app.include_router(drafts.router)
 app.include_router(practice.router)
\ No newline at end of file
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, List, Union
+
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# a migration step: SQL, or a function for changes SQL cannot make idempotent
+Step = Union[str, Callable[[Connection], None]]
+
+
+def _add_column(table: str, column: str, ddl: str) -> Callable[[Connection], None]:
+    """Step adding a column, unless create_all already made it."""
+
+    def step(conn: Connection) -> None:
+        existing = {
+            row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")
+        }
+        if column not in existing:
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN "{column}" {ddl}')
+
+    return step
+
+# Schema changes create_all cannot make on an existing database, in order.
+# Migration N (1-based) brings a database from PRAGMA user_version N-1 to N.
+# create_all runs first, so a new database gets every table, then all
+# migrations; steps must therefore be idempotent (IF NOT EXISTS, ...).
+# Never edit a released migration: append a new one.
+MIGRATIONS: List[List[Step]] = [
+    # 1: chunk position and fingerprint, so chunk ids survive edits
+    [
+        _add_column("source_chunks", "position", "INTEGER NOT NULL DEFAULT '0'"),
+        _add_column("source_chunks", "fingerprint", "VARCHAR NOT NULL DEFAULT ''"),
+    ],
+    # 2: indexes for the hot filters, matching how the queries sort
+    [
+        # review queue and summary: due <= today ORDER BY due, card_id
+        "CREATE INDEX IF NOT EXISTS ix_scheduling_states_due_card_id"
+        " ON scheduling_states (due, card_id)",
+        # card listing per deck / per source, ORDER BY id
+        "CREATE INDEX IF NOT EXISTS ix_cards_deck_id_id ON cards (deck_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_cards_source_id_id ON cards (source_id, id)",
+        # chunk -> cards lookups (pregeneration, re-chunking a source)
+        "CREATE INDEX IF NOT EXISTS ix_cards_source_chunk_id ON cards (source_chunk_id)",
+        # a source's chunks in reading order
+        "CREATE INDEX IF NOT EXISTS ix_source_chunks_source_id_position"
+        " ON source_chunks (source_id, position, id)",
+        # a card's review history, and deleting it with the card
+        "CREATE INDEX IF NOT EXISTS ix_review_logs_card_id_timestamp"
+        " ON review_logs (card_id, timestamp)",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """
+    Apply the migrations a database has not had yet, recording progress in
+    PRAGMA user_version. Returns the resulting version.
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+
+    version = schema_version(engine)
+    if version > SCHEMA_VERSION:
+        logger.warning(
+            "Database schema version %s is newer than this app (%s)",
+            version,
+            SCHEMA_VERSION,
+        )
+        return version
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        with engine.begin() as conn:
+            for step in MIGRATIONS[target - 1]:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.exec_driver_sql(step)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+        logger.info("Migrated database schema to version %s", target)
+    return SCHEMA_VERSION
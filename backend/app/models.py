@@ -16,6 +16,22 @@ class Source(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     chunks: List["SourceChunk"] = Relationship(back_populates="source")
     cards: List["Card"] = Relationship(back_populates="source")
+    manifest: Optional["ScanManifestEntry"] = Relationship(
+        back_populates="source"
+    )
+
+
+class ScanManifestEntry(SQLModel, table=True):
+    """Last observed file stat for a source, used to skip unchanged files."""
+
+    __tablename__ = "scan_manifest"
+
+    source_id: int = Field(foreign_key="sources.id", primary_key=True)
+    size: int
+    mtime_ns: int
+    inode: int
+
+    source: Optional[Source] = Relationship(back_populates="manifest")
 
 
 class SourceChunk(SQLModel, table=True):
@@ -26,6 +42,10 @@ class SourceChunk(SQLModel, table=True):
     kind: str
     loc: str
     text: str
+    # order within the source and content/position identity, see
+    # content_manager.chunk_fingerprint
+    position: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    fingerprint: str = Field(default="", sa_column_kwargs={"server_default": ""})
 
     source: Optional[Source] = Relationship(back_populates="chunks")
     cards: List["Card"] = Relationship(back_populates="source_chunk")
@@ -94,3 +114,61 @@ class ReviewLog(SQLModel, table=True):
     duration_ms: int
 
     card: Optional[Card] = Relationship(back_populates="reviews")
+
+
+class LLMCacheEntry(SQLModel, table=True):
+    """Cached card generation, keyed by a hash of the full LLM request."""
+
+    __tablename__ = "llm_cache"
+
+    key: str = Field(primary_key=True)
+    model: str
+    response: str  # JSON list of {"front", "back"} cards
+    size_bytes: int
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class GenerationJob(SQLModel, table=True):
+    """A queued or finished background card generation, see jobs.py."""
+
+    __tablename__ = "generation_jobs"
+
+    id: str = Field(primary_key=True)
+    status: str = Field(default="queued", index=True)
+    priority: str = "interactive"
+    request: str  # JSON GenerateCardsRequest
+    result: Optional[str] = None  # JSON list of {"front", "back"} cards
+    error: Optional[str] = None
+    progress_done: int = 0
+    progress_total: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class PregenQueueEntry(SQLModel, table=True):
+    """A chunk's state in idle-time pre-generation, see pregen.py."""
+
+    __tablename__ = "pregen_queue"
+
+    chunk_id: int = Field(foreign_key="source_chunks.id", primary_key=True)
+    # chunk fingerprint the state refers to; a changed chunk is queued again
+    fingerprint: str
+    status: str = Field(default="queued", index=True)  # queued, done, skipped, failed
+    attempts: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DraftCard(SQLModel, table=True):
+    """A pre-generated card suggestion waiting to be accepted or rejected."""
+
+    __tablename__ = "draft_cards"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source_id: int = Field(foreign_key="sources.id", index=True)
+    source_chunk_id: int = Field(foreign_key="source_chunks.id", index=True)
+    front: str
+    back: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from sqlmodel import Session
+
+from . import embedding_index
+from .config import NOTES_ROOT
+from .content_manager import ingest_paths, scan_notes_root
+from .db import engine
+from .pregen import pregenerator
+
+logger = logging.getLogger(__name__)
+
+
+class NotesScanner:
+    """
+    Runs notes scans and ingests in a worker thread with its own session,
+    so the event loop keeps serving requests while the tree is read,
+    parsed and written. Scans run one at a time; a scan requested while
+    another is running waits for it. Afterwards the embedding index and
+    pre-generation queue are told chunks may have changed.
+    """
+
+    def __init__(self, notes_root: Path = NOTES_ROOT):
+        self.notes_root = notes_root
+        self._lock = threading.Lock()
+        self.state = "idle"
+        self.kind: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.duration_seconds: Optional[float] = None
+        self.processed: Optional[int] = None
+        self.error: Optional[str] = None
+        self.scans = 0
+
+    async def scan(self) -> int:
+        """Full scan of the notes tree; returns the sources processed."""
+        processed = await asyncio.to_thread(
+            self._run, "full", lambda s: scan_notes_root(s, self.notes_root)
+        )
+        logger.info("Notes scan complete: %s sources processed", processed)
+        self._notify()
+        return processed
+
+    async def ingest(self, rel_paths: Iterable[str]) -> int:
+        """Bring only rel_paths up to date; returns the sources processed."""
+        rel_paths = list(rel_paths)
+        processed = await asyncio.to_thread(
+            self._run,
+            "changes",
+            lambda s: ingest_paths(s, self.notes_root, rel_paths),
+        )
+        logger.info(
+            "Notes change ingested: %s paths changed, %s sources processed",
+            len(rel_paths),
+            processed,
+        )
+        self._notify()
+        return processed
+
+    def _run(self, kind: str, work: Callable[[Session], int]) -> int:
+        with self._lock:
+            self.state = "scanning"
+            self.kind = kind
+            self.started_at = datetime.utcnow()
+            start = time.monotonic()
+            try:
+                with Session(engine) as session:
+                    processed = work(session)
+            except Exception as e:
+                self.error = str(e)
+                raise
+            else:
+                self.error = None
+                self.processed = processed
+            finally:
+                self.state = "idle"
+                self.finished_at = datetime.utcnow()
+                self.duration_seconds = round(time.monotonic() - start, 3)
+                self.scans += 1
+        return processed
+
+    def _notify(self) -> None:
+        # chunks may have changed: refresh what is derived from them
+        embedding_index.request_sync()
+        pregenerator.request_enqueue()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration_seconds,
+            "processed_sources": self.processed,
+            "error": self.error,
+            "scans": self.scans,
+        }
+
+
+scanner = NotesScanner()
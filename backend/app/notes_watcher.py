@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .content_manager import is_note_file, iter_note_files
+
+logger = logging.getLogger(__name__)
+
+ChangeHandler = Callable[[Set[str]], Awaitable[None]]
+
+
+class NotesWatcher:
+    """
+    Watch the notes tree and hand batches of changed paths (relative to
+    notes_root) to on_changes.
+
+    Events are debounced: a batch is only delivered once no new event arrived
+    for debounce_seconds, so an editor saving through a temp file and a rename
+    produces a single ingest of the final file.
+
+    Uses watchdog (inotify on Linux) when available and it starts, otherwise
+    polls the tree with one stat() per file every poll_interval seconds.
+    """
+
+    def __init__(
+        self,
+        notes_root: Path,
+        on_changes: ChangeHandler,
+        mode: str = "auto",
+        debounce_seconds: float = 1.5,
+        poll_interval_seconds: float = 10.0,
+    ) -> None:
+        self.notes_root = notes_root
+        self.on_changes = on_changes
+        self.mode = mode
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+
+        self._pending: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        observer = self._start_observer() if self.mode in ("auto", "watchdog") else None
+        poller: Optional[asyncio.Task[None]] = None
+        if observer is None:
+            if self.mode == "watchdog":
+                logger.warning("watchdog unavailable, falling back to polling")
+            logger.info(
+                "Watching %s by polling every %ss",
+                self.notes_root,
+                self.poll_interval_seconds,
+            )
+            poller = asyncio.create_task(self._poll())
+        else:
+            logger.info("Watching %s with watchdog", self.notes_root)
+
+        try:
+            while True:
+                await self._wakeup.wait()
+                # debounce: wait until the tree has been quiet for a while
+                while True:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), self.debounce_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        break
+
+                batch, self._pending = self._pending, set()
+                if not batch:
+                    continue
+                try:
+                    await self.on_changes(batch)
+                except Exception:
+                    logger.exception("Failed to ingest changed notes")
+        finally:
+            if poller is not None:
+                poller.cancel()
+            if observer is not None:
+                observer.stop()
+                observer.join(timeout=5)
+
+    def _add(self, rel_path: str) -> None:
+        self._pending.add(rel_path)
+        self._wakeup.set()
+
+    def notify(self, abs_path: str, is_directory: bool) -> None:
+        """Thread-safe entry point for filesystem events."""
+        rel_path = os.path.relpath(abs_path, self.notes_root)
+        if rel_path == "." or rel_path.startswith(os.pardir):
+            return
+        if not is_directory and not is_note_file(rel_path):
+            return
+        assert self._loop is not None
+        self._loop.call_soon_threadsafe(self._add, rel_path)
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:
+                # a directory's own "modified" event fires for every change
+                # inside it and carries no information of its own
+                if event.is_directory and event.event_type == "modified":
+                    return
+                for raw in (event.src_path, getattr(event, "dest_path", "")):
+                    if raw:
+                        path = os.fsdecode(raw)
+                        watcher.notify(path, event.is_directory)
+
+        observer = Observer()
+        observer.daemon = True
+        try:
+            observer.schedule(_Handler(), str(self.notes_root), recursive=True)
+            observer.start()
+        except (OSError, RuntimeError) as e:
+            # e.g. the inotify watch limit on a large tree
+            logger.warning("Could not start watchdog observer: %s", e)
+            return None
+        return observer
+
+    async def _poll(self) -> None:
+        previous = await asyncio.to_thread(self._snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval_seconds)
+            try:
+                current = await asyncio.to_thread(self._snapshot)
+            except Exception:
+                logger.exception("Failed to poll notes root")
+                continue
+
+            changed = {
+                rel
+                for rel in previous.keys() | current.keys()
+                if previous.get(rel) != current.get(rel)
+            }
+            previous = current
+            for rel in changed:
+                self._add(rel)
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int, int]]:
+        if not self.notes_root.exists():
+            return {}
+        return {
+            rel: (st.st_size, st.st_mtime_ns, st.st_ino)
+            for rel, _path, st in iter_note_files(self.notes_root)
+        }
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, exists, func, insert, literal, update
+from sqlmodel import Session, select
+
+from .admission import admission
+from .config import (
+    PREGEN_CARDS_PER_CHUNK,
+    PREGEN_ENABLED,
+    PREGEN_IDLE_SECONDS,
+    PREGEN_MAX_ATTEMPTS,
+    PREGEN_MIN_CHUNK_CHARS,
+)
+from .db import engine
+from .generation_planner import generate_cards_planned
+from .llm_client import interactive_idle_seconds, interactive_started
+from .models import Card, DraftCard, PregenQueueEntry, SourceChunk
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+PREGEN_TEMPERATURE = 0.7
+PREGEN_CLIENT_ID = "pregen"
+
+
+class Pregenerator:
+    """
+    Generates draft cards for new or changed chunks while the LLM is idle.
+
+    Chunks are tracked in the pregen_queue table by fingerprint, so edited
+    chunks are queued again and their old drafts dropped. Short chunks and
+    chunks that already have cards are skipped. Work only starts once no
+    user-driven generation has run for PREGEN_IDLE_SECONDS, and an in-flight
+    draft generation is aborted (and retried later) as soon as one starts.
+    Draft generations take an admission slot, waiting rather than being
+    rejected when all are busy.
+
+    Queue and draft reads and writes run in worker threads, so a queue sync
+    over every chunk after a scan does not stall the event loop.
+    """
+
+    def __init__(self, enabled: bool = PREGEN_ENABLED):
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task[None]] = None
+        self._enqueue_task: Optional[asyncio.Task[None]] = None
+        self._enqueue_requested = False
+        self._wake = asyncio.Event()
+        self.current_chunk_id: Optional[int] = None
+        self.interruptions = 0
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.enqueue_changed)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._enqueue_task, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._enqueue_task = None
+
+    def request_enqueue(self) -> None:
+        """
+        Queue chunks changed by a scan and wake the worker, in the
+        background. Requests made while a queue sync is running are
+        coalesced into one more pass.
+        """
+        if self._task is None:
+            return
+        self._enqueue_requested = True
+        if self._enqueue_task is None or self._enqueue_task.done():
+            self._enqueue_task = asyncio.create_task(self._run_enqueue())
+
+    async def _run_enqueue(self) -> None:
+        while self._enqueue_requested:
+            self._enqueue_requested = False
+            try:
+                queued = await asyncio.to_thread(self.enqueue_changed)
+            except Exception:
+                logger.exception("Pre-generation: failed to queue changed chunks")
+                continue
+            if queued:
+                logger.info("Pre-generation: %s chunks queued", queued)
+            self._wake.set()
+
+    def enqueue_changed(self) -> int:
+        """
+        Sync pregen_queue with source_chunks; returns the number newly queued.
+        Blocking; call via asyncio.to_thread.
+        """
+        with Session(engine) as session:
+            # chunks deleted by rescans
+            live = select(SourceChunk.id)
+            session.exec(delete(DraftCard).where(DraftCard.source_chunk_id.not_in(live)))
+            session.exec(
+                delete(PregenQueueEntry).where(PregenQueueEntry.chunk_id.not_in(live))
+            )
+
+            # edited chunks: drafts are stale, generate again
+            changed = session.exec(
+                select(PregenQueueEntry.chunk_id)
+                .join(SourceChunk, SourceChunk.id == PregenQueueEntry.chunk_id)
+                .where(PregenQueueEntry.fingerprint != SourceChunk.fingerprint)
+            ).all()
+            if changed:
+                session.exec(delete(DraftCard).where(DraftCard.source_chunk_id.in_(changed)))
+                session.exec(
+                    update(PregenQueueEntry)
+                    .where(PregenQueueEntry.chunk_id.in_(changed))
+                    .values(
+                        fingerprint=select(SourceChunk.fingerprint)
+                        .where(SourceChunk.id == PregenQueueEntry.chunk_id)
+                        .scalar_subquery(),
+                        status=QUEUED,
+                        attempts=0,
+                        updated_at=datetime.utcnow(),
+                    )
+                )
+
+            # new chunks
+            has_cards = exists().where(Card.source_chunk_id == SourceChunk.id)
+            untracked = ~exists().where(PregenQueueEntry.chunk_id == SourceChunk.id)
+            new_rows = select(
+                SourceChunk.id,
+                SourceChunk.fingerprint,
+                case(
+                    (func.length(SourceChunk.text) < PREGEN_MIN_CHUNK_CHARS, SKIPPED),
+                    (has_cards, SKIPPED),
+                    else_=QUEUED,
+                ),
+                literal(0),
+                literal(datetime.utcnow()),
+            ).where(untracked)
+            before = self._count(session, QUEUED)
+            session.exec(
+                insert(PregenQueueEntry.__table__).from_select(
+                    ["chunk_id", "fingerprint", "status", "attempts", "updated_at"],
+                    new_rows,
+                )
+            )
+            queued = self._count(session, QUEUED) - before + len(changed)
+            session.commit()
+        return queued
+
+    def status(self) -> dict:
+        with Session(engine) as session:
+            counts: Dict[str, int] = dict(
+                session.exec(
+                    select(PregenQueueEntry.status, func.count()).group_by(
+                        PregenQueueEntry.status
+                    )
+                ).all()
+            )
+            drafts = session.exec(select(func.count()).select_from(DraftCard)).one()
+        return {
+            "enabled": self.enabled,
+            "paused": self.enabled and interactive_idle_seconds() < PREGEN_IDLE_SECONDS,
+            "current_chunk_id": self.current_chunk_id,
+            "interruptions": self.interruptions,
+            "drafts": drafts,
+            **{s: counts.get(s, 0) for s in (QUEUED, DONE, SKIPPED, FAILED)},
+        }
+
+    @staticmethod
+    def _count(session: Session, status: str) -> int:
+        return session.exec(
+            select(func.count())
+            .select_from(PregenQueueEntry)
+            .where(PregenQueueEntry.status == status)
+        ).one()
+
+    def _next(self) -> Optional[SourceChunk]:
+        with Session(engine) as session:
+            return session.exec(
+                select(SourceChunk)
+                .join(PregenQueueEntry, PregenQueueEntry.chunk_id == SourceChunk.id)
+                .where(PregenQueueEntry.status == QUEUED)
+                .order_by(SourceChunk.source_id, SourceChunk.position)
+                .limit(1)
+            ).first()
+
+    async def _wait_idle(self) -> None:
+        while True:
+            idle = interactive_idle_seconds()
+            if idle >= PREGEN_IDLE_SECONDS:
+                return
+            await asyncio.sleep(max(1.0, PREGEN_IDLE_SECONDS - idle))
+
+    async def _run(self) -> None:
+        while True:
+            chunk = await asyncio.to_thread(self._next)
+            if chunk is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            await self._wait_idle()
+            interactive_started.clear()
+            self.current_chunk_id = chunk.id
+            generation = asyncio.create_task(self._generate(chunk))
+            interrupt = asyncio.create_task(interactive_started.wait())
+            try:
+                await asyncio.wait(
+                    {generation, interrupt}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                interrupt.cancel()
+                if not generation.done():
+                    generation.cancel()
+                await asyncio.gather(generation, interrupt, return_exceptions=True)
+                self.current_chunk_id = None
+
+            if generation.cancelled():
+                # a user request came in; the chunk stays queued
+                self.interruptions += 1
+                continue
+            if generation.exception() is not None:
+                logger.warning(
+                    "Pre-generation failed for chunk %s: %s",
+                    chunk.id,
+                    generation.exception(),
+                )
+                await asyncio.to_thread(self._record_failure, chunk)
+                # the LLM may be down: back off before the next chunk
+                await asyncio.sleep(PREGEN_IDLE_SECONDS)
+                continue
+            await asyncio.to_thread(self._store, chunk, generation.result())
+
+    async def _generate(self, chunk: SourceChunk) -> list:
+        # waits for an admission slot like any other generation, never rejected
+        async with admission.enqueue(PREGEN_CLIENT_ID, wait=True):
+            return await generate_cards_planned(
+                [chunk.text], None, PREGEN_CARDS_PER_CHUNK, PREGEN_TEMPERATURE
+            )
+
+    def _record_failure(self, chunk: SourceChunk) -> None:
+        with Session(engine) as session:
+            entry = session.get(PregenQueueEntry, chunk.id)
+            if entry is None:
+                return
+            entry.attempts += 1
+            if entry.attempts >= PREGEN_MAX_ATTEMPTS:
+                entry.status = FAILED
+            entry.updated_at = datetime.utcnow()
+            session.add(entry)
+            session.commit()
+
+    def _store(self, chunk: SourceChunk, cards: list) -> None:
+        with Session(engine) as session:
+            entry = session.get(PregenQueueEntry, chunk.id)
+            if entry is None or entry.fingerprint != chunk.fingerprint:
+                # chunk changed or vanished while generating
+                return
+            session.exec(delete(DraftCard).where(DraftCard.source_chunk_id == chunk.id))
+            for card in cards:
+                session.add(
+                    DraftCard(
+                        source_id=chunk.source_id,
+                        source_chunk_id=chunk.id,
+                        front=card["front"],
+                        back=card["back"],
+                    )
+                )
+            entry.status = DONE
+            entry.updated_at = datetime.utcnow()
+            session.add(entry)
+            session.commit()
+
+
+pregenerator = Pregenerator()
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from .config import REVIEW_QUEUE_CHECK_SECONDS
+from .models import SchedulingState
+
+logger = logging.getLogger(__name__)
+
+
+def load_statement(today: date):
+    """The cards due by today, as loaded into the queue."""
+    return select(SchedulingState.card_id, SchedulingState.due).where(
+        SchedulingState.due <= today
+    )
+
+
+def due_count_statement(today: date):
+    """The number of cards due by today, compared with the queue's size."""
+    return select(func.count()).where(SchedulingState.due <= today)
+
+
+class ReviewQueue:
+    """
+    The cards due today, as a heap of (due, card id) in review order, so
+    /review/next is a heap peek instead of a sorted query.
+
+    Loaded lazily from the due index on first use each day, then kept up to
+    date by the routes that change scheduling: reviews (update), new cards
+    (add) and deleted cards (remove). Superseded heap entries are skipped
+    when they reach the top. Every REVIEW_QUEUE_CHECK_SECONDS the number of
+    due cards is compared with the database, and the queue reloaded if
+    they disagree (e.g. after a write that bypassed the routes).
+    """
+
+    def __init__(self, check_seconds: float = REVIEW_QUEUE_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._day: Optional[date] = None
+        self._heap: List[Tuple[date, int]] = []
+        # card id -> due, for the cards in the queue
+        self._due: Dict[int, date] = {}
+        self._checked_at = 0.0
+        self.loads = 0
+
+    def next_card_id(self, session: Session) -> Optional[int]:
+        """The most overdue card (lowest id first among equals), or None."""
+        with self._lock:
+            self._ensure(session)
+            while self._heap:
+                due, card_id = self._heap[0]
+                if self._due.get(card_id) == due:
+                    return card_id
+                heapq.heappop(self._heap)
+            return None
+
+    def update(self, card_id: int, due: date) -> None:
+        """A card's due date changed (or it was created)."""
+        with self._lock:
+            if self._day is None:
+                return
+            if due > self._day:
+                self._due.pop(card_id, None)
+                self._maybe_compact()
+                return
+            if self._due.get(card_id) != due:
+                self._due[card_id] = due
+                heapq.heappush(self._heap, (due, card_id))
+
+    def add(self, card_ids: Iterable[int], due: date) -> None:
+        for card_id in card_ids:
+            self.update(card_id, due)
+
+    def remove(self, card_ids: Iterable[int]) -> None:
+        with self._lock:
+            for card_id in card_ids:
+                self._due.pop(card_id, None)
+            self._maybe_compact()
+
+    def invalidate(self) -> None:
+        """Reload from the database on next use."""
+        with self._lock:
+            self._day = None
+
+    def _ensure(self, session: Session) -> None:
+        today = date.today()
+        if self._day != today:
+            self._load(session, today)
+        elif time.monotonic() - self._checked_at >= self.check_seconds:
+            self._check(session)
+
+    def _load(self, session: Session, today: date) -> None:
+        rows = session.exec(load_statement(today)).all()
+        self._due = {card_id: due for card_id, due in rows}
+        self._heap = [(due, card_id) for card_id, due in rows]
+        heapq.heapify(self._heap)
+        self._day = today
+        self._checked_at = time.monotonic()
+        self.loads += 1
+
+    def _check(self, session: Session) -> None:
+        self._checked_at = time.monotonic()
+        count = session.exec(due_count_statement(self._day)).one()
+        if count != len(self._due):
+            logger.warning(
+                "Review queue out of sync (%s queued, %s due), reloading",
+                len(self._due),
+                count,
+            )
+            self._load(session, self._day)
+
+    def _maybe_compact(self) -> None:
+        # drop superseded entries once they make up most of the heap
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, card_id) for card_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def summary(self) -> dict:
+        return {
+            "day": self._day,
+            "queued": len(self._due),
+            "heap_size": len(self._heap),
+            "loads": self.loads,
+        }
+
+
+review_queue = ReviewQueue()
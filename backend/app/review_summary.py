@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlmodel import Session, select
+
+from .config import REVIEW_SUMMARY_CACHE_SECONDS
+from .models import Card, SchedulingState
+
+# SM-2 gives the first two successful reviews fixed intervals (1 and 6
+# days); until then, and again after a lapse, a card is still learning
+LEARNING_REPETITIONS = 2
+
+COUNTS = ("due", "overdue", "new", "learning", "due_soon")
+
+# (today, days) -> (computed at, summary)
+_cache: Dict[Tuple[date, int], Tuple[float, dict]] = {}
+_lock = threading.Lock()
+# bumped by invalidate(), so a summary computed across it is not cached
+_generation = 0
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def summary_statement(days: int, today: date):
+    """
+    The grouped query behind compute(): one row per deck with its COUNTS.
+    Also checked by scripts/check_query_plans.py.
+    """
+    state = SchedulingState
+    is_new = and_(state.repetitions == 0, state.interval == 0)
+    return (
+        select(
+            Card.deck_id,
+            _count_if(state.due <= today),
+            _count_if(state.due < today),
+            _count_if(is_new),
+            _count_if(and_(~is_new, state.repetitions < LEARNING_REPETITIONS)),
+            _count_if(
+                and_(state.due > today, state.due <= today + timedelta(days=days))
+            ),
+        )
+        .join(Card, Card.id == state.card_id)
+        .group_by(Card.deck_id)
+        .order_by(Card.deck_id)
+    )
+
+
+def compute(session: Session, days: int, today: Optional[date] = None) -> dict:
+    """
+    Review counts per deck in one grouped query over scheduling_states:
+    due (due today or earlier), overdue (due before today), new (never
+    reviewed), learning (see LEARNING_REPETITIONS) and due_soon (due in the
+    next `days` days, after today).
+    """
+    stmt = summary_statement(days, today or date.today())
+    decks = [
+        {"deck_id": deck_id, **dict(zip(COUNTS, counts))}
+        for deck_id, *counts in session.exec(stmt).all()
+    ]
+    totals = {name: sum(d[name] for d in decks) for name in COUNTS}
+    return {"days": days, **totals, "decks": decks}
+
+
+def get_summary(session: Session, days: int) -> dict:
+    """compute(), cached for REVIEW_SUMMARY_CACHE_SECONDS."""
+    key = (date.today(), days)
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None and now - hit[0] < REVIEW_SUMMARY_CACHE_SECONDS:
+            return hit[1]
+        generation = _generation
+    summary = compute(session, days, today=key[0])
+    with _lock:
+        if generation == _generation:
+            _cache[key] = (now, summary)
+    return summary
+
+
+def invalidate() -> None:
+    """Drop cached summaries; call after reviews and card changes."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -24,6 +24,12 @@ class SourceChunkRead(BaseModel):
         orm_mode = True
 
 
+class ChunkSearchResult(SourceChunkRead):
+    source_id: int
+    snippet: Optional[str] = None
+    score: Optional[float] = None
+
+
 class DeckRead(BaseModel):
     id: int
     name: str
@@ -86,6 +92,10 @@ class BulkCreateCardsRequest(BaseModel):
     cards: List[BulkCardCreateItem]
 
 
+class BatchDeleteCardsRequest(BaseModel):
+    card_ids: List[int]
+
+
 class ReviewCard(BaseModel):
     card_id: int
     deck_id: int
@@ -106,8 +116,24 @@ class ReviewAnswerRequest(BaseModel):
     duration_ms: int = 0
 
 
+class DeckReviewCounts(BaseModel):
+    deck_id: int
+    due: int
+    overdue: int
+    new: int
+    learning: int
+    due_soon: int
+
+
 class ReviewSummary(BaseModel):
     due_count: int
+    overdue: int
+    new: int
+    learning: int
+    # due after today, within the next `days` days
+    due_soon: int
+    days: int
+    decks: List[DeckReviewCounts]
 
 
 class GenerateCardsRequest(BaseModel):
@@ -116,6 +142,8 @@ class GenerateCardsRequest(BaseModel):
     instructions: Optional[str] = None
     num_cards: int = 10
     temperature: float = 0.7
+    # set to False to always ask the LLM, bypassing the generation cache
+    use_cache: bool = True
 
 
 class GeneratedCard(BaseModel):
@@ -125,3 +153,43 @@ class GeneratedCard(BaseModel):
 
 class GenerateCardsResponse(BaseModel):
     cards: List[GeneratedCard]
+
+
+class GenerateJobRequest(GenerateCardsRequest):
+    # interactive jobs are started before any queued bulk jobs
+    priority: Literal["interactive", "bulk"] = "interactive"
+
+
+class JobRead(BaseModel):
+    id: str
+    status: str  # queued, running, succeeded, failed or cancelled
+    priority: str
+    progress_done: int
+    progress_total: int
+    cards: Optional[List[GeneratedCard]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class DraftCardRead(BaseModel):
+    id: int
+    source_id: int
+    source_chunk_id: int
+    front: str
+    back: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class DraftSelection(BaseModel):
+    # drafts to act on: the listed ids, or all drafts of a source
+    draft_ids: Optional[List[int]] = None
+    source_id: Optional[int] = None
+
+
+class AcceptDraftsRequest(DraftSelection):
+    deck_id: int
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import html
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "source_chunks_fts"
+
+# snippet() highlight markers: private-use characters, swapped for <mark>
+# tags only after the note text around them is HTML-escaped
+_MARK_OPEN = "\ue000"
+_MARK_CLOSE = "\ue001"
+
+# external-content FTS5 index over source_chunks; the triggers keep it in sync
+# with every write the scanner makes (bulk inserts, in-place edits, deletes)
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, loc,
+        content='source_chunks', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON source_chunks
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, loc)
+        VALUES (new.id, new.text, new.loc);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON source_chunks
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, loc)
+        VALUES ('delete', old.id, old.text, old.loc);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text, loc
+    ON source_chunks
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, loc)
+        VALUES ('delete', old.id, old.text, old.loc);
+        INSERT INTO {FTS_TABLE}(rowid, text, loc)
+        VALUES (new.id, new.text, new.loc);
+    END
+    """,
+]
+
+# bm25 column weights: (text, loc) - a hit in a heading counts for more
+_BM25_WEIGHTS = "1.0, 2.0"
+
+fts_available = False
+
+
+def ensure_fts_index(engine: Engine) -> bool:
+    """
+    Create the FTS5 index and its sync triggers if needed, populating it from
+    existing chunks the first time. Returns False if this SQLite build has no
+    FTS5, in which case search falls back to substring matching.
+    """
+    global fts_available
+
+    if engine.dialect.name != "sqlite":
+        fts_available = False
+        return False
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+                {"name": FTS_TABLE},
+            ).first()
+            for ddl in _FTS_DDL:
+                conn.execute(text(ddl))
+            if exists is None:
+                conn.execute(
+                    text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                )
+    except OperationalError as e:
+        logger.warning("SQLite FTS5 unavailable, search will scan chunks: %s", e)
+        fts_available = False
+        return False
+
+    fts_available = True
+    return True
+
+
+_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_fts_query(q: str) -> Optional[str]:
+    """
+    Turn free-text user input into a safe FTS5 MATCH expression.
+
+    - "quoted text" is kept as a phrase query
+    - a trailing * makes the last word of a term a prefix query
+    - every other term is quoted, so FTS5 operators and punctuation in the
+      input (C++, AND, -x, ...) never cause syntax errors
+    Terms are combined with AND. Returns None if nothing searchable is left.
+    """
+    terms: List[str] = []
+    for match in _TOKEN_RE.finditer(q):
+        phrase, word = match.groups()
+        if phrase is not None:
+            words = _WORD_RE.findall(phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+
+        words = _WORD_RE.findall(word)
+        if not words:
+            continue
+        prefix = word.endswith("*")
+        for i, w in enumerate(words):
+            if prefix and i == len(words) - 1:
+                terms.append(f'"{w}"*')
+            else:
+                terms.append(f'"{w}"')
+
+    if not terms:
+        return None
+    return " AND ".join(terms)
+
+
+def search_chunks_fts(
+    session: Session,
+    q: str,
+    limit: int,
+    source_id: Optional[int] = None,
+    source_type: Optional[str] = None,
+) -> List[dict]:
+    """
+    BM25-ranked full-text search over chunks. Returns dicts with the chunk
+    fields plus a highlighted snippet and its bm25 score (lower is better).
+    The snippet is HTML: note text is escaped, matches are in <mark> tags.
+    """
+    match = build_fts_query(q)
+    if match is None:
+        return []
+
+    filters = ""
+    params = {
+        "match": match,
+        "limit": limit,
+        "mark_open": _MARK_OPEN,
+        "mark_close": _MARK_CLOSE,
+    }
+    if source_id is not None:
+        filters += " AND c.source_id = :source_id"
+        params["source_id"] = source_id
+    if source_type is not None:
+        filters += " AND s.type = :source_type"
+        params["source_type"] = source_type
+
+    sql = f"""
+        SELECT c.id, c.source_id, c.kind, c.loc, c.text,
+               snippet({FTS_TABLE}, 0, :mark_open, :mark_close, '…', 16) AS snippet,
+               bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score
+        FROM {FTS_TABLE}
+        JOIN source_chunks AS c ON c.id = {FTS_TABLE}.rowid
+        JOIN sources AS s ON s.id = c.source_id
+        WHERE {FTS_TABLE} MATCH :match{filters}
+        ORDER BY score
+        LIMIT :limit
+    """
+    rows = session.execute(text(sql), params).mappings().all()
+    return [{**row, "snippet": _snippet_html(row["snippet"])} for row in rows]
+
+
+def _snippet_html(snippet: Optional[str]) -> Optional[str]:
+    if snippet is None:
+        return None
+    return (
+        html.escape(snippet, quote=False)
+        .replace(_MARK_OPEN, "<mark>")
+        .replace(_MARK_CLOSE, "</mark>")
+    )
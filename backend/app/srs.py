@@ -1,16 +1,18 @@
 from datetime import date, datetime, timedelta
 from .models import Card, SchedulingState
 
+def initial_scheduling_values() -> dict:
+    """Scheduling state columns of a new card, for bulk inserts."""
+    return {
+        "due": date.today(),
+        "interval": 0,
+        "ease_factor": 2.5,
+        "repetitions": 0,
+        "lapses": 0,
+    }
+
 def initialize_scheduling_state(card: Card) -> SchedulingState:
-    today = date.today()
-    return SchedulingState(
-        card_id=card.id,
-        due=today,
-        interval=0,
-        ease_factor=2.5,
-        repetitions=0,
-        lapses=0,
-    )
+    return SchedulingState(card_id=card.id, **initial_scheduling_values())
 
 def map_quality_to_sm2_grade(quality: int) -> int:
 
@@ -0,0 +1,87 @@
+"""
+Measure llama.cpp prompt evaluation with and without prompt cache reuse.
+
+Runs the same card generation several times against the configured LLM
+server, first without cache_prompt/id_slot, then with them, and prints the
+server-reported prompt_ms and evaluated prompt tokens for each request.
+
+    cd backend && python -m scripts.bench_prompt_cache [--source-id N] [--runs 3]
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from sqlmodel import Session, select
+
+from app import llm_slots
+from app.content_manager import load_chunk_texts
+from app.db import engine, init_db
+from app.generation_planner import plan_generation
+from app.llm_client import call_llm_for_cards, close_http_client
+from app.llm_router import router
+from app.models import SourceChunk
+
+
+async def _source_text(source_id: Optional[int], num_cards: int) -> str:
+    with Session(engine) as session:
+        if source_id is None:
+            source_id = session.exec(select(SourceChunk.source_id).limit(1)).first()
+            if source_id is None:
+                raise SystemExit("No ingested sources; run a notes scan first")
+        texts = load_chunk_texts(session, source_id, None)
+    windows = await plan_generation(texts, None, num_cards)
+    return windows[0].text
+
+
+async def _run(text: str, runs: int, num_cards: int) -> List[dict]:
+    rows = []
+    for i in range(runs):
+        # vary the instructions: only the prompt suffix after the source text
+        # changes, as when a user regenerates with different instructions
+        await call_llm_for_cards(
+            text, f"variant {i}", num_cards, 0.0, use_cache=False
+        )
+        rows.append(llm_slots.summary([b.slots for b in router.backends]))
+        llm_slots.reset_timings()
+    return rows
+
+
+def _print(label: str, rows: List[dict]) -> float:
+    total = 0.0
+    for i, row in enumerate(rows):
+        kind = "warm" if row["warm"]["requests"] else "cold"
+        t = row[kind]
+        total += t["avg_prompt_ms"] or 0.0
+        print(
+            f"{label:>7} run {i + 1}: {kind:4}  prompt_ms={t['avg_prompt_ms']}"
+            f"  evaluated={t['avg_prompt_tokens']}  cached={t['avg_cached_tokens']}"
+        )
+    return total / len(rows) if rows else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source-id", type=int, default=None)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--num-cards", type=int, default=5)
+    args = parser.parse_args()
+
+    init_db()
+
+    async def bench() -> tuple:
+        text = await _source_text(args.source_id, args.num_cards)
+        llm_slots.enabled = False
+        before = await _run(text, args.runs, args.num_cards)
+        llm_slots.enabled = True
+        after = await _run(text, args.runs, args.num_cards)
+        await close_http_client()
+        return before, after
+
+    before, after = asyncio.run(bench())
+    avg_before = _print("before", before)
+    avg_after = _print("after", after)
+    print(f"average prompt_ms: before {avg_before:.1f}, after {avg_after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
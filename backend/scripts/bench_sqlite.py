@@ -0,0 +1,136 @@
+"""
+Measure review reads while a large notes ingest writes to SQLite.
+
+Generates a folder of synthetic markdown notes, then for the default SQLite
+settings and for the tuned profile (see app.db.sqlite_pragmas) ingests it
+into a fresh database while reader threads keep running the review queue
+queries. Prints ingest time, read latency and reads that failed on a
+locked database.
+
+    cd backend && python -m scripts.bench_sqlite [--notes 2000] [--readers 4]
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import func, insert
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, select
+
+from app.content_manager import scan_notes_root
+from app.db import create_db_engine
+from app.migrations import run_migrations
+from app.models import Card, Deck, SchedulingState
+from app.search_index import ensure_fts_index
+from app.srs import initial_scheduling_values
+
+SEED_CARDS = 20000
+
+
+def _write_notes(root: Path, count: int) -> None:
+    for i in range(count):
+        sections = "\n\n".join(
+            f"## Section {j}\n\n" + f"Note {i} section {j} talks about topic {j}. " * 20
+            for j in range(8)
+        )
+        (root / f"note_{i:05d}.md").write_text(f"# Note {i}\n\n{sections}\n")
+
+
+def _setup(engine) -> None:
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    ensure_fts_index(engine)
+    with Session(engine) as session:
+        deck = Deck(name="bench")
+        session.add(deck)
+        session.flush()
+        ids = session.execute(
+            insert(Card).returning(Card.id, sort_by_parameter_order=True),
+            [
+                {"deck_id": deck.id, "front": f"q{i}", "back": f"a{i}"}
+                for i in range(SEED_CARDS)
+            ],
+        ).scalars().all()
+        initial = initial_scheduling_values()
+        session.execute(
+            insert(SchedulingState), [{"card_id": i, **initial} for i in ids]
+        )
+        session.commit()
+
+
+def _reader(
+    engine, stop: threading.Event, latencies: List[float], errors: List[str]
+) -> None:
+    today = date.today()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                session.exec(
+                    select(func.count()).where(SchedulingState.due <= today)
+                ).one()
+                session.exec(
+                    select(SchedulingState, Card)
+                    .join(Card, Card.id == SchedulingState.card_id)
+                    .where(SchedulingState.due <= today)
+                    .order_by(SchedulingState.due, SchedulingState.card_id)
+                    .limit(1)
+                ).first()
+        except OperationalError as e:
+            errors.append(str(e.orig))
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def _run(label: str, tuned: bool, notes: Path, readers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{tmp}/bench.db", tuned=tuned)
+        _setup(engine)
+
+        stop = threading.Event()
+        latencies: List[float] = []
+        errors: List[str] = []
+        threads = [
+            threading.Thread(target=_reader, args=(engine, stop, latencies, errors))
+            for _ in range(readers)
+        ]
+        for t in threads:
+            t.start()
+        start = time.perf_counter()
+        with Session(engine) as session:
+            processed = scan_notes_root(session, notes)
+        ingest_s = time.perf_counter() - start
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    ordered = sorted(latencies) or [0.0]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:>7}: ingest {processed} notes in {ingest_s:.1f}s, "
+        f"{len(latencies)} reads, p50 {statistics.median(ordered):.1f}ms, "
+        f"p99 {p99:.1f}ms, max {ordered[-1]:.1f}ms, {len(errors)} locked"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        notes = Path(tmp)
+        _write_notes(notes, args.notes)
+        _run("default", False, notes, args.readers)
+        _run("tuned", True, notes, args.readers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Measure backend cold start and catch startup regressions.
+
+Records the import time of app.main (python -X importtime, best of
+--runs) and the time from launching uvicorn to the first healthy
+/api/health, against a fresh database and an empty notes folder. Fails
+if a module that should only load on first use (PyMuPDF, numpy) is
+imported at startup, or, with --baseline, if a timing got more than
+--tolerance slower than the saved baseline.
+
+    cd backend && python -m scripts.bench_startup [--runs 5] [--top 15]
+    cd backend && python -m scripts.bench_startup --baseline startup.json --save
+    cd backend && python -m scripts.bench_startup --baseline startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# imported lazily on first use; loading one at startup is a regression
+LAZY_MODULES = ("fitz", "pymupdf", "numpy")
+
+HEALTH_TIMEOUT_SECONDS = 60.0
+
+
+def _env(tmp: str) -> Dict[str, str]:
+    notes = Path(tmp) / "notes"
+    notes.mkdir(exist_ok=True)
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp}/startup.db",
+        "NOTES_ROOT": str(notes),
+        "NOTES_WATCH_MODE": "off",
+        "EMBEDDING_INDEX_DIR": str(Path(tmp) / "embedding_index"),
+        "PREGEN_ENABLED": "0",
+    }
+
+
+def _import_times(env: Dict[str, str]) -> Tuple[float, Dict[str, int]]:
+    """Cumulative ms to import app.main, and self time (us) per module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_ms = 0.0
+    self_us: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            own, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        name = fields[2].strip()
+        self_us[name] = own
+        if name == "app.main":
+            total_ms = cumulative / 1000
+    return total_ms, self_us
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _time_to_healthy(env: Dict[str, str]) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < HEALTH_TIMEOUT_SECONDS:
+            if proc.poll() is not None:
+                raise SystemExit("uvicorn exited during startup")
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/api/health", timeout=1
+                ) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise SystemExit("/api/health did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _regressions(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    problems = []
+    for key in ("import_ms", "healthy_ms"):
+        old, new = baseline.get(key), result[key]
+        if old and new > old * (1 + tolerance):
+            problems.append(f"{key}: {new:.0f} vs baseline {old:.0f}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules shown")
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    imports: List[float] = []
+    healthy: List[float] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = _env(tmp)
+        for _ in range(args.runs):
+            total_ms, self_us = _import_times(env)
+            imports.append(total_ms)
+        for _ in range(args.runs):
+            healthy.append(_time_to_healthy(env) * 1000)
+
+    result = {"import_ms": min(imports), "healthy_ms": min(healthy)}
+    print(f"import app.main: {result['import_ms']:.0f}ms (best of {args.runs})")
+    print(f"launch to healthy /api/health: {result['healthy_ms']:.0f}ms")
+    print("slowest modules (self time):")
+    for name, us in sorted(self_us.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"  {us / 1000:7.1f}ms  {name}")
+
+    problems = [
+        f"{name} imported at startup"
+        for name in LAZY_MODULES
+        if name in self_us
+    ]
+    if args.baseline is not None:
+        if args.save:
+            args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+            print(f"baseline written to {args.baseline}")
+        elif args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+            problems += _regressions(result, baseline, args.tolerance)
+        else:
+            raise SystemExit(f"No baseline at {args.baseline}; run with --save")
+
+    if problems:
+        print("startup regressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Check that the main API queries use indexes instead of full table scans.
+
+Runs EXPLAIN QUERY PLAN for the queries behind the review summary and
+queue, card listing, source chunks and card deletion against the configured
+database (migrated first) and exits non-zero if any of them scans a whole table or
+sorts where an index should give the order.
+
+    cd backend && python -m scripts.check_query_plans [-v]
+"""
+import argparse
+import sys
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy.dialects import sqlite
+from sqlmodel import select
+
+from app.db import engine, init_db
+from app.models import Card, ReviewLog, SchedulingState, SourceChunk
+from app.review_queue import due_count_statement, load_statement
+from app.review_summary import summary_statement
+
+# the /review/summary default
+SUMMARY_DAYS = 7
+
+# (name, statement, must come out in index order without a sort); the review
+# queries are built by the modules that run them, so they can't drift
+QUERIES: List[Tuple[str, object, bool]] = [
+    (
+        "review summary",
+        summary_statement(SUMMARY_DAYS, date.today()),
+        False,
+    ),
+    ("review queue load", load_statement(date.today()), False),
+    ("review queue check", due_count_statement(date.today()), False),
+    (
+        "scheduling state of a card",
+        select(SchedulingState).where(SchedulingState.card_id == 1),
+        False,
+    ),
+    (
+        "cards by deck",
+        select(Card).where(Card.deck_id == 1).order_by(Card.id),
+        True,
+    ),
+    (
+        "cards by source",
+        select(Card).where(Card.source_id == 1).order_by(Card.id),
+        True,
+    ),
+    (
+        "cards of a chunk",
+        select(Card.id).where(Card.source_chunk_id == 1),
+        False,
+    ),
+    (
+        "chunks of a source",
+        select(SourceChunk.text)
+        .where(SourceChunk.source_id == 1)
+        .order_by(SourceChunk.position, SourceChunk.id),
+        True,
+    ),
+    (
+        "review logs of a card",
+        select(ReviewLog).where(ReviewLog.card_id == 1),
+        False,
+    ),
+]
+
+
+def _plan(conn, statement) -> List[str]:
+    compiled = statement.compile(dialect=sqlite.dialect(paramstyle="named"))
+    rows = conn.exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled}", dict(compiled.params)
+    ).all()
+    return [row[-1] for row in rows]
+
+
+def _problems(plan: List[str], ordered: bool) -> List[str]:
+    problems = []
+    for step in plan:
+        # "SCAN t" is a full scan; "SCAN t USING [COVERING] INDEX" walks an index
+        if step.startswith("SCAN ") and " INDEX " not in f"{step} ":
+            problems.append(step)
+        if ordered and "TEMP B-TREE" in step:
+            problems.append(step)
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+
+    failed = 0
+    with engine.connect() as conn:
+        for name, statement, ordered in QUERIES:
+            plan = _plan(conn, statement)
+            problems = _problems(plan, ordered)
+            print(f"{'FAIL' if problems else 'ok':>4}  {name}")
+            for step in plan if args.verbose else problems:
+                print(f"      {step}")
+            failed += bool(problems)
+
+    if failed:
+        print(f"{failed} of {len(QUERIES)} queries scan or sort")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
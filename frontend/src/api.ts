@@ -4,11 +4,20 @@ import type {
   Deck,
   Card,
   ReviewCard,
-  GeneratedCard
+  GeneratedCard,
+  DraftCard
 } from "./types";
 
 const API_BASE = "http://127.0.0.1:8000/api";
 
+// identifies this window to the backend's generation admission queue, which
+// otherwise sees every local caller as the same 127.0.0.1 client
+const CLIENT_ID = crypto.randomUUID();
+const GENERATE_HEADERS = {
+  "Content-Type": "application/json",
+  "X-Client-Id": CLIENT_ID
+};
+
 async function handleResponse<T>(resp: Response): Promise<T> {
   if (!resp.ok) {
     const text = await resp.text();
@@ -125,6 +134,39 @@ export async function bulkCreateCards(
   return handleResponse<Card[]>(resp);
 }
 
+export async function listDrafts(sourceId?: number): Promise<DraftCard[]> {
+  const url =
+    sourceId != null
+      ? `${API_BASE}/drafts?source_id=${sourceId}`
+      : `${API_BASE}/drafts`;
+  const resp = await fetch(url);
+  return handleResponse<DraftCard[]>(resp);
+}
+
+export async function acceptDrafts(
+  deckId: number,
+  selection: { draft_ids?: number[]; source_id?: number }
+): Promise<{ created: number }> {
+  const resp = await fetch(`${API_BASE}/drafts/accept`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ deck_id: deckId, ...selection })
+  });
+  return handleResponse<{ created: number }>(resp);
+}
+
+export async function rejectDrafts(selection: {
+  draft_ids?: number[];
+  source_id?: number;
+}): Promise<{ removed: number }> {
+  const resp = await fetch(`${API_BASE}/drafts/reject`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(selection)
+  });
+  return handleResponse<{ removed: number }>(resp);
+}
+
 export async function generateCardsFromSource(params: {
   source_id?: number; // optional
   chunk_ids?: number[]; // optional
@@ -134,13 +176,72 @@ export async function generateCardsFromSource(params: {
 }): Promise<GeneratedCard[]> {
   const resp = await fetch(`${API_BASE}/generate_cards`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: GENERATE_HEADERS,
     body: JSON.stringify(params)
   });
   const data = await handleResponse<{ cards: GeneratedCard[] }>(resp);
   return data.cards;
 }
 
+/**
+ * Streaming variant of generateCardsFromSource: calls onCard for each card
+ * as soon as the backend emits it and resolves with all cards at the end.
+ */
+export async function streamGenerateCards(
+  params: {
+    source_id?: number;
+    chunk_ids?: number[];
+    instructions?: string;
+    num_cards: number;
+    temperature: number;
+  },
+  onCard: (card: GeneratedCard) => void
+): Promise<GeneratedCard[]> {
+  const resp = await fetch(`${API_BASE}/generate_cards/stream`, {
+    method: "POST",
+    headers: GENERATE_HEADERS,
+    body: JSON.stringify(params)
+  });
+  if (!resp.ok || !resp.body) {
+    const text = await resp.text();
+    throw new Error(`HTTP ${resp.status}: ${text}`);
+  }
+
+  const cards: GeneratedCard[] = [];
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep: number;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === "card") {
+        cards.push(payload as GeneratedCard);
+        onCard(payload as GeneratedCard);
+      } else if (event === "error") {
+        throw new Error(payload.detail ?? "Generation failed");
+      }
+    }
+  }
+  return cards;
+}
+
 
 export type PracticePool = "due_recent" | "all" | "new_only";
 
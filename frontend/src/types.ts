@@ -50,6 +50,15 @@ export interface GeneratedCard {
   back: string;
 }
 
+export interface DraftCard {
+  id: number;
+  source_id: number;
+  source_chunk_id: number;
+  front: string;
+  back: string;
+  created_at: string;
+}
+
 export type PracticePool = "due_recent" | "all" | "new_only";
 
 export interface PracticeCard {
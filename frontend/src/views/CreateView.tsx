@@ -4,10 +4,19 @@ import {
   listSources,
   getSourceChunks,
   listDecks,
-  generateCardsFromSource,
-  bulkCreateCards
+  streamGenerateCards,
+  bulkCreateCards,
+  listDrafts,
+  acceptDrafts,
+  rejectDrafts
 } from "../api";
-import type { Source, SourceChunk, Deck, GeneratedCard } from "../types";
+import type {
+  Source,
+  SourceChunk,
+  Deck,
+  GeneratedCard,
+  DraftCard
+} from "../types";
 import { RenderMath } from "../components/RenderMath";
 import { Collapse } from "../components/Collapse";
 
@@ -21,6 +30,7 @@ export const SourcesView: React.FC = () => {
   const [sourceFilter, setSourceFilter] = useState("");
   const [selectedSourceId, setSelectedSourceId] = useState<number | null>(null);
   const [chunks, setChunks] = useState<SourceChunk[]>([]);
+  const [drafts, setDrafts] = useState<DraftCard[]>([]);
   const [selectedChunkIds, setSelectedChunkIds] = useState<number[]>([]);
 
   // Deck / generation controls
@@ -93,6 +103,7 @@ export const SourcesView: React.FC = () => {
     // Selecting a different source
     setSelectedSourceId(sourceId);
     setChunks([]);
+    setDrafts([]);
     setSelectedChunkIds([]);
     setGenerated([]);
     resetMessages();
@@ -105,6 +116,7 @@ export const SourcesView: React.FC = () => {
     try {
       const data = await getSourceChunks(sourceId);
       setChunks(data);
+      setDrafts(await listDrafts(sourceId));
     } catch (e) {
       setError(`Failed to load chunks: ${(e as Error).message}`);
     }
@@ -198,13 +210,11 @@ export const SourcesView: React.FC = () => {
         }
       }
 
-      const cards = await generateCardsFromSource(payload);
-      const withSelection: SelectableGeneratedCard[] = cards.map((c) => ({
-        ...c,
-        selected: true
-      }));
-      setGenerated(withSelection);
-      setMessage(`Generated ${withSelection.length} cards.`);
+      // show each card as soon as the model has written it
+      const cards = await streamGenerateCards(payload, (card) =>
+        setGenerated((prev) => [...prev, { ...card, selected: true }])
+      );
+      setMessage(`Generated ${cards.length} cards.`);
     } catch (e) {
       setError(`Failed to generate cards: ${(e as Error).message}`);
     } finally {
@@ -218,6 +228,34 @@ export const SourcesView: React.FC = () => {
     );
   }
 
+  async function handleAcceptDrafts() {
+    resetMessages();
+    if (!selectedDeckId || selectedSourceId === null) {
+      setError("Select a deck first.");
+      return;
+    }
+    try {
+      const { created } = await acceptDrafts(selectedDeckId, {
+        source_id: selectedSourceId
+      });
+      setDrafts([]);
+      setMessage(`Saved ${created} suggested cards to deck.`);
+    } catch (e) {
+      setError(`Failed to save suggested cards: ${(e as Error).message}`);
+    }
+  }
+
+  async function handleDismissDrafts() {
+    resetMessages();
+    if (selectedSourceId === null) return;
+    try {
+      await rejectDrafts({ source_id: selectedSourceId });
+      setDrafts([]);
+    } catch (e) {
+      setError(`Failed to dismiss suggested cards: ${(e as Error).message}`);
+    }
+  }
+
   async function handleSaveGenerated() {
     resetMessages();
 
@@ -344,6 +382,27 @@ export const SourcesView: React.FC = () => {
                 </div>
               </div>
 
+              {drafts.length > 0 && (
+                <div
+                  className="button-row"
+                  style={{ marginBottom: "0.5rem", alignItems: "center" }}
+                >
+                  <span style={{ fontSize: "0.85rem", color: "#cbd5e1" }}>
+                    {drafts.length} suggested cards ready
+                  </span>
+                  <button
+                    className="button small"
+                    onClick={handleAcceptDrafts}
+                    disabled={!selectedDeckId}
+                  >
+                    Add all to deck
+                  </button>
+                  <button className="button small" onClick={handleDismissDrafts}>
+                    Dismiss
+                  </button>
+                </div>
+              )}
+
               <div
                 className="button-row"
                 style={{ marginBottom: "0.5rem", marginTop: "0.25rem" }}